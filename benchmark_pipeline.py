@@ -0,0 +1,351 @@
+"""
+CreatorOS - Pipeline Benchmark
+Misst die Stufen der Content-Factory-Pipeline an synthetischen Bildern
+(Wall-Time, Megapixel pro Sekunde, Spitzen-RSS) und schreibt die Ergebnisse
+als JSON, damit Läufe über Commits hinweg vergleichbar sind.
+
+    python benchmark_pipeline.py --output bench.json
+    python benchmark_pipeline.py --sizes 1920x1080 --modes RGB --compare bench.json
+"""
+
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import PIL
+from PIL import Image
+
+from image_pipeline import (
+    EXIF_ORIENTATION,
+    OUTPUT_FORMATS,
+    add_watermark,
+    encode_image,
+    make_thumbnail,
+    process_image,
+    remove_metadata,
+    strip_metadata_lossless,
+)
+
+# =============================================================================
+# CONSTANTS
+# =============================================================================
+
+DEFAULT_SIZES = ["1080x1080", "3000x2000", "6000x4000"]
+DEFAULT_MODES = ["RGB", "RGBA", "P"]
+DEFAULT_FORMATS = ["PNG", "JPEG"]
+DEFAULT_REPEAT = 3
+
+# EXIF-Orientierung der gedrehten Varianten (6 = 90° im Uhrzeigersinn)
+ROTATED_ORIENTATION = 6
+
+# Einstellungen wie in user_settings (PRO, damit der eigene Text gerastert wird)
+BENCH_SETTINGS = {
+    "watermark_text": "© CreatorOS Benchmark",
+    "opacity": 180,
+    "padding": 50,
+    "output_format": "JPEG",
+    "jpeg_quality": 85,
+    "is_pro": True,
+    "strip_only": False,
+    "encoder_profile": "balanced",
+}
+
+# =============================================================================
+# SYNTHETISCHE BILDER
+# =============================================================================
+
+def make_image(size, mode):
+    """Deterministisches Testbild: Verläufe plus Rauschen (realistischer als Flächen)"""
+    red = Image.linear_gradient("L").resize(size)
+    green = Image.effect_noise(size, 40)
+    blue = Image.radial_gradient("L").resize(size)
+    image = Image.merge("RGB", (red, green, blue))
+
+    if mode == "RGBA":
+        alpha = Image.linear_gradient("L").rotate(90).resize(size)
+        image.putalpha(alpha)
+    elif mode == "P":
+        image = image.quantize(256)
+    return image
+
+
+def encode_input(image, orientation):
+    """Kodiert das Testbild wie ein Upload (RGB als JPEG, sonst PNG) mit optionaler EXIF-Drehung"""
+    exif = Image.Exif()
+    exif[0x010F] = "CreatorOS Benchmark Camera"
+    if orientation:
+        exif[EXIF_ORIENTATION] = orientation
+
+    buffer = io.BytesIO()
+    if image.mode == "RGB":
+        image.save(buffer, "JPEG", quality=90, exif=exif)
+    else:
+        image.save(buffer, "PNG", exif=exif)
+    return buffer.getvalue()
+
+# =============================================================================
+# SPEICHERMESSUNG
+# =============================================================================
+
+def _read_status_kb(field):
+    """Feld aus /proc/self/status in KB oder None"""
+    try:
+        with open("/proc/self/status", "r", encoding="ascii") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def _reset_peak_rss():
+    """Setzt VmHWM auf den aktuellen RSS zurück (Linux); False wenn nicht möglich"""
+    try:
+        with open("/proc/self/clear_refs", "w", encoding="ascii") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_kb():
+    """Spitzen-RSS seit dem letzten Zurücksetzen (sonst seit Prozessstart)"""
+    peak = _read_status_kb("VmHWM")
+    if peak is None:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform == "darwin":
+            peak //= 1024  # macOS meldet Bytes
+    return peak
+
+# =============================================================================
+# MESSUNG
+# =============================================================================
+
+def measure(fn, repeat):
+    """Führt fn repeat-mal aus; gibt (zeiten, spitzen_rss_kb, rss_zuwachs_kb, letztes_ergebnis) zurück"""
+    before = _read_status_kb("VmRSS")
+    resettable = _reset_peak_rss()
+
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+
+    peak = _peak_rss_kb()
+    delta = peak - before if resettable and before is not None else None
+    return times, peak, delta, result
+
+
+def run_case(size, mode, orientation, formats, repeat):
+    """Misst alle Stufen für eine Kombination aus Größe, Modus und Drehung.
+
+    Läuft in einem frischen Prozess, damit Spitzen-RSS und Caches nicht
+    von vorherigen Fällen verfälscht werden.
+    """
+    source = make_image(size, mode)
+    data = encode_input(source, orientation)
+    del source
+
+    megapixels = size[0] * size[1] / 1_000_000
+    case = {
+        "width": size[0],
+        "height": size[1],
+        "mode": mode,
+        "exif_orientation": orientation,
+        "input_bytes": len(data),
+    }
+    rows = []
+
+    def record(stage, fn, *args, **kwargs):
+        # Eingaben als Argumente statt per Closure - die Namen werden
+        # danach per del freigegeben
+        times, peak, delta, result = measure(lambda: fn(*args, **kwargs), repeat)
+        median = statistics.median(times)
+        rows.append(dict(
+            case,
+            stage=stage,
+            seconds_min=min(times),
+            seconds_median=median,
+            megapixels_per_second=megapixels / median if median else None,
+            peak_rss_mb=peak / 1024,
+            peak_rss_delta_mb=delta / 1024 if delta is not None else None,
+            output_bytes=len(result) if isinstance(result, bytes) else None,
+        ))
+        return result
+
+    def decode():
+        image = Image.open(io.BytesIO(data))
+        image.load()
+        return image
+
+    decoded = record("decode", decode)
+    cleaned = record("remove_metadata", remove_metadata, decoded)
+    del decoded
+
+    # Warmlauf außerhalb der Messung: Schrift und Kachel liegen danach im Cache
+    add_watermark(cleaned.copy(), BENCH_SETTINGS["watermark_text"], BENCH_SETTINGS["opacity"], BENCH_SETTINGS["padding"], True)
+    watermarked = record(
+        "add_watermark", add_watermark,
+        cleaned, BENCH_SETTINGS["watermark_text"], BENCH_SETTINGS["opacity"], BENCH_SETTINGS["padding"], True
+    )
+    record(
+        "add_watermark_banded", add_watermark,
+        cleaned, BENCH_SETTINGS["watermark_text"], BENCH_SETTINGS["opacity"], BENCH_SETTINGS["padding"], True, banded=True
+    )
+    del cleaned
+
+    encoded = {}
+    for output_format in formats:
+        encoded[output_format] = record(
+            f"encode_{output_format.lower()}", encode_image,
+            watermarked, output_format, BENCH_SETTINGS["jpeg_quality"], BENCH_SETTINGS["encoder_profile"]
+        )
+    record("thumbnail", make_thumbnail, watermarked)
+    del watermarked
+
+    def build_zip():
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zf:
+            for output_format, payload in encoded.items():
+                zf.writestr(f"image.{output_format.lower()}", payload)
+        return buffer.getvalue()
+
+    record("zip", build_zip)
+    encoded.clear()
+
+    def strip_lossless():
+        return strip_metadata_lossless(data)[0]
+
+    record("strip_lossless", strip_lossless)
+    record("process_image", lambda: process_image(data, BENCH_SETTINGS)["data"])
+    record("process_image_feed", lambda: process_image(data, dict(BENCH_SETTINGS, export_preset="feed"))["data"])
+    return rows
+
+# =============================================================================
+# AUSGABE
+# =============================================================================
+
+def _git_commit():
+    """Aktueller Commit oder None (z.B. außerhalb eines Checkouts)"""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    """Rahmendaten eines Laufs"""
+    return {
+        "commit": _git_commit(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "pillow": PIL.__version__,
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "output_formats_available": OUTPUT_FORMATS,
+    }
+
+
+def _row_key(row):
+    return (row["width"], row["height"], row["mode"], row["exif_orientation"], row["stage"])
+
+
+def _case_label(row):
+    rotated = " rot" if row["exif_orientation"] else ""
+    return f"{row['width']}x{row['height']} {row['mode']}{rotated}"
+
+
+def print_table(results, baseline=None, stream=sys.stderr):
+    """Lesbare Tabelle; mit baseline zusätzlich das Verhältnis der Mediane (>1 = schneller)"""
+    base = {_row_key(row): row for row in baseline or []}
+    header = f"{'Fall':<24} {'Stufe':<22} {'Median s':>9} {'MP/s':>8} {'Peak MB':>8} {'+RSS MB':>8}"
+    if baseline is not None:
+        header += f" {'vs. Basis':>9}"
+    print(header, file=stream)
+
+    for row in results:
+        delta = row["peak_rss_delta_mb"]
+        line = (
+            f"{_case_label(row):<24} {row['stage']:<22} {row['seconds_median']:>9.4f} "
+            f"{row['megapixels_per_second'] or 0:>8.1f} {row['peak_rss_mb']:>8.1f} "
+            f"{delta if delta is not None else float('nan'):>8.1f}"
+        )
+        if baseline is not None:
+            old = base.get(_row_key(row))
+            speedup = old["seconds_median"] / row["seconds_median"] if old and row["seconds_median"] else None
+            line += f" {f'{speedup:.2f}x' if speedup else '-':>9}"
+        print(line, file=stream)
+
+
+def parse_size(text):
+    """'BREITExHÖHE' -> (breite, höhe)"""
+    width, height = text.lower().split("x")
+    return int(width), int(height)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark der Content-Factory-Pipeline")
+    parser.add_argument("--sizes", default=",".join(DEFAULT_SIZES), help="Kommagetrennte Auflösungen, z.B. 1080x1080,6000x4000")
+    parser.add_argument("--modes", default=",".join(DEFAULT_MODES), help="Kommagetrennte Bildmodi (RGB, RGBA, P)")
+    parser.add_argument("--formats", default=",".join(DEFAULT_FORMATS), help="Kommagetrennte Ausgabeformate für die Encode-Stufe")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="Wiederholungen pro Stufe")
+    parser.add_argument("--no-rotation", action="store_true", help="Nur Varianten ohne EXIF-Drehung")
+    parser.add_argument("--output", help="JSON-Datei (Default: stdout)")
+    parser.add_argument("--compare", help="Früheres JSON-Ergebnis als Vergleichsbasis")
+    args = parser.parse_args(argv)
+
+    sizes = [parse_size(size) for size in args.sizes.split(",")]
+    modes = args.modes.split(",")
+    formats = [output_format.upper() for output_format in args.formats.split(",")]
+    unavailable = [output_format for output_format in formats if output_format not in OUTPUT_FORMATS]
+    if unavailable:
+        parser.error(f"Format nicht verfügbar: {', '.join(unavailable)}")
+    orientations = [0] if args.no_rotation else [0, ROTATED_ORIENTATION]
+
+    results = []
+    context = multiprocessing.get_context("spawn")
+    for size in sizes:
+        for mode in modes:
+            for orientation in orientations:
+                # Frischer Prozess pro Fall, damit der Spitzen-RSS nur diesen Fall misst
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                    rows = executor.submit(run_case, size, mode, orientation, formats, args.repeat).result()
+                print(f"✓ {_case_label(rows[0])}", file=sys.stderr)
+                results.extend(rows)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+    print_table(results, baseline)
+
+    report = {"environment": environment(), "settings": BENCH_SETTINGS, "results": results}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
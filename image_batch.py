@@ -0,0 +1,368 @@
+"""
+CreatorOS - Image Batch
+Parallele Batch-Verarbeitung der Content Factory über einen Prozess-Pool
+"""
+
+import io
+import multiprocessing
+import os
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from image_pipeline import admit_image, probe_image, process_image, render_cache_stats
+from image_spool import map_file
+from image_store import output_key, output_store, settings_digest
+
+# =============================================================================
+# CONSTANTS
+# =============================================================================
+
+# Anzahl Worker-Prozesse (per Umgebungsvariable überschreibbar)
+DEFAULT_WORKERS = int(os.environ.get("CREATOROS_IMAGE_WORKERS", 0)) or (os.cpu_count() or 1)
+
+# Gleichzeitig eingereichte Bilder pro Worker - begrenzt, wie viele Uploads
+# und Ergebnisse gleichzeitig im RAM liegen
+IN_FLIGHT_PER_WORKER = 2
+
+# Bis zu dieser Größe bleibt das ZIP im RAM, danach wird auf Platte ausgelagert
+ZIP_SPOOL_MAX_MEMORY = int(os.environ.get("CREATOROS_ZIP_SPOOL_MB", 64)) * 1024 * 1024
+
+# So oft wird ein Bild eingereicht, wenn der Pool unterwegs abstürzt
+# (z.B. OOM-Kill) - stürzt er erneut ab, gilt nur dieses Bild als Fehler
+POOL_ATTEMPTS = 2
+
+# Gleichzeitig verarbeitete Bilder im Band-Modus (begrenzt den Spitzen-RAM)
+LARGE_IMAGES_IN_FLIGHT = int(os.environ.get("CREATOROS_LARGE_IMAGES_IN_FLIGHT", 1))
+
+# Prozessweit, nicht pro Batch: laufen mehrere Batches nebeneinander (Image-
+# Worker), teilen sie sich die Plätze. Freigegeben wird, sobald das Bild im
+# Pool fertig ist - unabhängig davon, ob der Batch noch konsumiert wird
+_large_slots = threading.BoundedSemaphore(LARGE_IMAGES_IN_FLIGHT)
+
+# =============================================================================
+# PROCESS POOL
+# =============================================================================
+
+_executor = None
+_executor_workers = 0
+_executor_lock = threading.Lock()
+
+
+def get_executor(workers=None):
+    """Liefert den prozessweiten Pool und baut ihn nur bei geänderter Größe neu.
+
+    Der Pool überlebt Streamlit-Reruns, die Worker werden also nur einmal
+    gestartet. "spawn" statt fork, weil der Streamlit-Server Threads hält.
+    """
+    global _executor, _executor_workers
+
+    workers = workers or DEFAULT_WORKERS
+    with _executor_lock:
+        if _executor is None or _executor_workers != workers:
+            if _executor is not None:
+                _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+            _executor_workers = workers
+        return _executor
+
+
+def discard_executor(executor):
+    """Verwirft einen kaputten Pool (Worker-Prozess gestorben) - get_executor baut neu"""
+    global _executor
+
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _submit(workers, fn, *args):
+    """Reicht beim Pool ein; ist er kaputt, wird er einmal neu gebaut.
+
+    Gibt (pool, future) zurück - der Pool wird gebraucht, um ihn bei einem
+    späteren Absturz gezielt zu verwerfen.
+    """
+    executor = get_executor(workers)
+    try:
+        return executor, executor.submit(fn, *args)
+    except BrokenProcessPool:
+        discard_executor(executor)
+        executor = get_executor(workers)
+        return executor, executor.submit(fn, *args)
+
+
+def _read(data):
+    """Eingabe-Bytes erst bei Bedarf lesen (bytes oder UploadedFile/BytesIO; Pfade siehe _process_file)"""
+    if isinstance(data, bytes):
+        return data
+    return data.getvalue()
+
+
+def _output_name(filename, ext):
+    """Dateiname mit neuer Endung"""
+    return f"{filename.rsplit('.', 1)[0]}.{ext}"
+
+
+def _result(filename, result):
+    """Ergebnis von process_image um die Ausgabe-Dateinamen ergänzen.
+
+    Bei mehreren Presets landet jede Ausgabe in einem Ordner pro Preset,
+    'filename' bleibt dann der Upload-Name.
+    """
+    if 'outputs' in result:
+        for output in result['outputs']:
+            output['filename'] = f"{output['preset']}/{_output_name(filename, output.pop('ext'))}"
+        result['filename'] = filename
+    else:
+        result['filename'] = _output_name(filename, result.pop('ext'))
+    return result
+
+
+def result_outputs(result):
+    """Alle Ausgaben eines Ergebnisses als Dicts mit 'filename' und 'data'"""
+    return result.get('outputs', [result])
+
+
+def _store(key, result):
+    """Frisch kodiertes Ergebnis im Platten-Cache ablegen (nur Einzelausgaben, nur mit Schlüssel)"""
+    if key is not None and 'outputs' not in result:
+        output_store.put(key, result['data'], result['ext'], result['thumbnail'] or b"")
+    return result
+
+
+def _run_one(filename, data, settings, key):
+    """Ein Bild im aktuellen Prozess verarbeiten"""
+    try:
+        result = _process(data if isinstance(data, os.PathLike) else _read(data), settings)
+        return _result(filename, _store(key, result))
+    except Exception as e:
+        return {'filename': filename, 'error': str(e)}
+
+
+def _submit_image(workers, data, settings, large):
+    """Reicht ein Bild beim Pool ein; große Bilder geben ihren Platz frei, sobald sie fertig sind.
+
+    Der Platz in _large_slots muss für große Bilder bereits belegt sein.
+    """
+    try:
+        executor, future = _submit(workers, _process, data, settings)
+    except BaseException:
+        if large:
+            _large_slots.release()
+        raise
+    if large:
+        future.add_done_callback(lambda _: _large_slots.release())
+    return executor, future
+
+
+def _prepare(entry, settings, settings_hash):
+    """(index, (dateiname, daten)) -> (index, dateiname, daten, cache_schlüssel, zulassung).
+
+    Dateipfade (z.B. gespoolte Uploads) werden für Hash und Header nur
+    gemappt und bleiben Pfade - die Bytes liest erst der Pool-Worker.
+    Ohne settings_hash (Cache aus) entfällt der Schlüssel samt Hash.
+    """
+    idx, (filename, data) = entry
+    if isinstance(data, os.PathLike):
+        with map_file(data) as mapped:
+            admission = admit_image(probe_image(mapped), settings)
+            # Abgelehnte (auch leere, nicht mappbare) Dateien brauchen keinen Schlüssel
+            key = output_key(mapped, settings_hash) if settings_hash and admission['action'] != "reject" else None
+        return idx, filename, data, key, admission
+
+    data = _read(data)
+    admission = admit_image(probe_image(io.BytesIO(data)), settings)
+    return idx, filename, data, output_key(data, settings_hash) if settings_hash else None, admission
+
+
+def _process_file(path, settings):
+    """process_image für einen Dateipfad - läuft im Pool-Worker.
+
+    Die Datei wird gemappt statt gelesen: Dekodieren bzw. Strippen lesen
+    direkt aus dem Page-Cache, die Rohdaten landen nie auf dem Heap.
+    """
+    with map_file(path) as mapped:
+        return process_image(mapped, settings)
+
+
+def _process(data, settings):
+    """process_image für Bytes oder einen Dateipfad, samt Cache-Zählern (render_cache) des rechnenden Prozesses"""
+    result = _process_file(data, settings) if isinstance(data, os.PathLike) else process_image(data, settings)
+    result['render_cache'] = render_cache_stats()
+    return result
+
+
+def iter_batch(items, settings, workers=None, max_in_flight=None, use_cache=True):
+    """Verarbeitet (dateiname, daten)-Paare und liefert (index, ergebnis) sobald fertig.
+
+    Es sind höchstens IN_FLIGHT_PER_WORKER Bilder pro Worker gleichzeitig
+    unterwegs (oder max_in_flight, wenn gesetzt - so teilen sich mehrere
+    Batches einen Pool), damit weder Uploads noch Ergebnisse für den ganzen
+    Batch im RAM landen. Vorher wird jeder Header geprüft (admit_image): abgelehnte
+    Bilder werden nie dekodiert, Bilder im Band-Modus oder mit
+    Eingangsbegrenzung laufen immer im Pool (nie im Streamlit-Prozess) und
+    höchstens LARGE_IMAGES_IN_FLIGHT gleichzeitig - prozessweit, über alle
+    parallel laufenden Batches.
+    Bereits kodierte Bilder (gleiche Bytes, gleiche Einstellungen) kommen
+    direkt aus dem Platten-Cache und tragen 'cached'; use_cache=False
+    umgeht den Cache ganz (weder lesen noch schreiben, z.B. in der CLI, die
+    ohnehin in ein Ausgabeverzeichnis schreibt). Stirbt ein Worker
+    (z.B. OOM-Kill), wird der Pool neu gebaut und die betroffenen Bilder
+    werden erneut eingereicht (POOL_ATTEMPTS). Ergebnisse sind Dicts
+    mit 'filename', 'data', 'thumbnail', 'encode_seconds' und 'seconds'
+    bzw. 'error'; frisch gerechnete tragen zusätzlich 'render_cache'
+    (render_cache_stats des rechnenden Prozesses).
+    """
+    workers = workers or DEFAULT_WORKERS
+    settings_hash = settings_digest(settings) if use_cache else None
+
+    # Einzelbilder oder 1 Worker: ohne Pool-Overhead im eigenen Prozess
+    in_process = workers <= 1 or len(items) <= 1
+    max_in_flight = max_in_flight or workers * IN_FLIGHT_PER_WORKER
+
+    pool_workers = None if in_process else workers
+    pending = {}
+    queue = (_prepare(entry, settings, settings_hash) for entry in enumerate(items))
+    next_item = next(queue, None)
+
+    try:
+        while next_item is not None or pending:
+            while next_item is not None:
+                idx, filename, data, key, admission = next_item
+
+                # Zulassung nur anhand des Headers - abgelehnte Bilder werden nie dekodiert
+                if admission['action'] == "reject":
+                    yield idx, {'filename': filename, 'error': admission['reason']}
+                    next_item = next(queue, None)
+                    continue
+                large = admission['action'] in ("band", "downscale")
+
+                cached = output_store.get(key) if key is not None else None
+                if cached is not None:
+                    cached.update(encode_seconds=0.0, seconds=0.0, cached=True)
+                    yield idx, _result(filename, cached)
+                    next_item = next(queue, None)
+                    continue
+
+                if in_process and not large:
+                    yield idx, _run_one(filename, data, settings, key)
+                    next_item = next(queue, None)
+                    continue
+
+                if len(pending) >= max_in_flight:
+                    break
+                # Ohne eigene offene Bilder auf einen freien Platz warten, sonst erst Ergebnisse abholen
+                if large and not _large_slots.acquire(blocking=not pending):
+                    break
+
+                executor, future = _submit_image(pool_workers, data, settings, large)
+                pending[future] = (idx, key, large, data, 1, executor)
+                next_item = next(queue, None)
+
+            if not pending:
+                continue
+
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                idx, key, large, data, attempt, executor = pending.pop(future)
+                filename = items[idx][0]
+                try:
+                    result = future.result()
+                except BrokenProcessPool:
+                    # Ein Worker ist gestorben (z.B. OOM) und hat alle laufenden
+                    # Bilder mitgerissen: Pool neu bauen, Bilder erneut einreichen.
+                    # Nur wer wieder abstürzt, wird als Fehler gemeldet
+                    discard_executor(executor)
+                    if attempt < POOL_ATTEMPTS:
+                        if large:
+                            _large_slots.acquire()
+                        executor, retry = _submit_image(pool_workers, data, settings, large)
+                        pending[retry] = (idx, key, large, data, attempt + 1, executor)
+                        continue
+                    yield idx, {'filename': filename, 'error': "Verarbeitung abgebrochen (Worker-Prozess abgestürzt, evtl. zu wenig Speicher)"}
+                    continue
+                except Exception as e:
+                    yield idx, {'filename': filename, 'error': str(e)}
+                    continue
+                yield idx, _result(filename, _store(key, result))
+    finally:
+        # Abbruch durch den Aufrufer: wartende Bilder nicht mehr rechnen
+        for future in pending:
+            future.cancel()
+
+
+def estimate_batch(admissions, workers=None):
+    """Grobe Kosten eines Batches aus den Zulassungen von admit_image.
+
+    Berücksichtigt dieselben Grenzen wie iter_batch: pro Worker ein Bild in
+    Arbeit, große Bilder höchstens LARGE_IMAGES_IN_FLIGHT gleichzeitig (im
+    ganzen Prozess - der RAM-Wert gilt also auch bei parallelen Batches).
+    Gibt cpu_seconds, wall_seconds und peak_memory_bytes zurück.
+    """
+    workers = workers or DEFAULT_WORKERS
+    accepted = [admission for admission in admissions if admission['action'] != "reject"]
+    large = sorted(
+        (admission['memory_bytes'] for admission in accepted if admission['action'] in ("band", "downscale")),
+        reverse=True
+    )
+    normal = sorted(
+        (admission['memory_bytes'] for admission in accepted if admission['action'] == "ok"),
+        reverse=True
+    )
+    cpu_seconds = sum(admission['cpu_seconds'] for admission in accepted)
+    return {
+        "cpu_seconds": cpu_seconds,
+        "wall_seconds": cpu_seconds / max(1, min(workers, len(accepted))),
+        "peak_memory_bytes": sum(large[:LARGE_IMAGES_IN_FLIGHT]) + sum(normal[:workers]),
+    }
+
+
+def run_isolated(fn, *args):
+    """Führt eine Pipeline-Funktion im Pool statt im Streamlit-Prozess aus.
+
+    Stirbt dabei ein Worker, wird der Pool neu gebaut und der Aufruf einmal
+    wiederholt; stürzt er erneut ab, kommt BrokenProcessPool beim Aufrufer an.
+    """
+    for attempt in range(1, POOL_ATTEMPTS + 1):
+        executor, future = _submit(None, fn, *args)
+        try:
+            return future.result()
+        except BrokenProcessPool:
+            discard_executor(executor)
+            if attempt == POOL_ATTEMPTS:
+                raise
+
+# =============================================================================
+# ZIP STREAMING
+# =============================================================================
+
+def build_zip_archive(items, settings, workers=None, on_result=None, spool_max_memory=None, out=None, max_in_flight=None):
+    """Schreibt jedes Bild direkt nach Fertigstellung ins ZIP.
+
+    Ohne out landet das Archiv in einem SpooledTemporaryFile, das oberhalb
+    von spool_max_memory auf Platte ausgelagert wird. Kodierte Bilder werden
+    nach dem Schreiben sofort freigegeben, der Speicherbedarf hängt also
+    nicht von der Batch-Größe ab. on_result(fertig, gesamt, index, ergebnis)
+    wird pro Bild aufgerufen. Gibt das Archiv-Dateiobjekt zurück (ein
+    Spool steht wieder auf Position 0).
+    """
+    total = len(items)
+    target = out or tempfile.SpooledTemporaryFile(max_size=spool_max_memory or ZIP_SPOOL_MAX_MEMORY)
+
+    with zipfile.ZipFile(target, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for done, (idx, result) in enumerate(iter_batch(items, settings, workers, max_in_flight), start=1):
+            if 'error' not in result:
+                for output in result_outputs(result):
+                    zf.writestr(output['filename'], output['data'])
+            if on_result:
+                on_result(done, total, idx, result)
+
+    if out is None:
+        target.seek(0)
+    return target
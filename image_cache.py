@@ -0,0 +1,188 @@
+"""
+CreatorOS - Image Cache
+Prozessweite Caches der Content Factory (Vorschau-Proxys, -Renders und Thumbnails)
+"""
+
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+
+from image_batch import run_isolated
+from image_pipeline import open_proxy, render_preview, make_thumbnail, needs_band_mode, perceptual_hash, probe_image
+from image_spool import call_mapped, open_upload
+
+# =============================================================================
+# CONSTANTS
+# =============================================================================
+
+# Speicherbudget für Vorschau-Proxys und -Renders (über alle Sessions)
+PREVIEW_CACHE_MAX_BYTES = int(os.environ.get("CREATOROS_PREVIEW_CACHE_MB", 256)) * 1024 * 1024
+
+# Ungefährer Platzbedarf eines gecachten Hashes (int plus Schlüssel)
+PHASH_ENTRY_BYTES = 128
+
+# Ungefährer Platzbedarf eines gecachten Header-Probes (kleines Dict)
+PROBE_ENTRY_BYTES = 1024
+
+# =============================================================================
+# BYTE-BUDGET LRU
+# =============================================================================
+
+class ByteBudgetLRU:
+    """Thread-sicherer LRU-Cache, der nach Bytes statt nach Einträgen begrenzt.
+
+    Beim Überschreiten des Budgets werden die am längsten nicht genutzten
+    Einträge verworfen. Einträge, die allein größer als das Budget sind,
+    werden gar nicht erst aufgenommen.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Wert oder None; ein Treffer macht den Eintrag zum jüngsten"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, size):
+        """Legt einen Wert mit seiner Größe in Bytes ab"""
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[1]
+
+            self._entries[key] = (value, size)
+            self.current_bytes += size
+
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+
+    def stats(self):
+        """Treffer, Fehlschläge und Belegung"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+preview_cache = ByteBudgetLRU(PREVIEW_CACHE_MAX_BYTES)
+
+# =============================================================================
+# VORSCHAU
+# =============================================================================
+
+def upload_digest(data):
+    """Inhalts-Hash eines Uploads (Schlüssel für alle Caches)"""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def _image_bytes(image):
+    """Ungefährer RAM-Bedarf eines dekodierten Bildes"""
+    return image.width * image.height * len(image.getbands())
+
+
+def _decode(fn, upload):
+    """Große Uploads im Pool dekodieren, damit der Streamlit-Prozess klein bleibt.
+
+    Gespoolte Uploads werden per mmap gelesen - im Pool mappt der Worker
+    die Datei selbst, es wandern keine Bytes durch die Pipe.
+    """
+    with open_upload(upload) as fp:
+        if not needs_band_mode(fp):
+            return fn(fp)
+    if isinstance(upload, os.PathLike):
+        return run_isolated(call_mapped, fn, os.fspath(upload))
+    return run_isolated(fn, io.BytesIO(upload.getvalue()))
+
+
+def preview_key(digest, settings):
+    """Cache-Schlüssel eines Vorschau-Renders (Qualität zählt nicht bei PNG)"""
+    output_format = settings["output_format"]
+    return (
+        "preview",
+        digest,
+        settings["watermark_text"],
+        settings["opacity"],
+        settings["padding"],
+        output_format,
+        settings.get("jpeg_quality", 85) if output_format != "PNG" else None,
+        settings.get("encoder_profile"),
+        settings.get("export_preset"),
+        settings.get("watermark_logo"),
+        settings["is_pro"],
+    )
+
+
+def get_preview(digest, upload, settings):
+    """Vorschau aus dem Cache oder frisch gerendert.
+
+    Proxy und Render werden getrennt gecacht: ein neuer Slider-Wert rendert
+    nur den Proxy neu, ein bereits gesehener Wert kostet gar nichts.
+    Gibt (vorschau, geschätzte_bytes, ausgabe_größe) zurück.
+    """
+    key = preview_key(digest, settings)
+    cached = preview_cache.get(key)
+    if cached is not None:
+        return cached
+
+    proxy_entry = preview_cache.get(("proxy", digest))
+    if proxy_entry is None:
+        proxy_entry = _decode(open_proxy, upload)
+        preview_cache.put(("proxy", digest), proxy_entry, _image_bytes(proxy_entry[0]))
+
+    proxy, full_size = proxy_entry
+    result = render_preview(proxy, full_size, settings)
+    preview_cache.put(key, result, _image_bytes(result[0]))
+    return result
+
+
+def get_thumbnail(digest, upload):
+    """Thumbnail (Bytes) eines Uploads - per Draft-Modus dekodiert und gecacht"""
+    key = ("thumbnail", digest)
+    thumbnail = preview_cache.get(key)
+    if thumbnail is None:
+        thumbnail = _decode(make_thumbnail, upload)
+        preview_cache.put(key, thumbnail, len(thumbnail))
+    return thumbnail
+
+
+def get_perceptual_hash(digest, upload):
+    """Perceptual Hash eines Uploads (für die Duplikat-Erkennung) - gecacht"""
+    key = ("phash", digest)
+    value = preview_cache.get(key)
+    if value is None:
+        value = _decode(perceptual_hash, upload)
+        preview_cache.put(key, value, PHASH_ENTRY_BYTES)
+    return value
+
+
+def get_probe(digest, upload):
+    """Header-Probe eines Uploads (Größe, Modus, Frames, Drehung) - gecacht"""
+    key = ("probe", digest)
+    probe = preview_cache.get(key)
+    if probe is None:
+        with open_upload(upload) as fp:
+            probe = probe_image(fp)
+        preview_cache.put(key, probe, PROBE_ENTRY_BYTES)
+    return probe
@@ -0,0 +1,279 @@
+"""
+CreatorOS - Image CLI
+Headless-Batchverarbeitung der Content Factory für große Shootings direkt
+auf dem Server - ohne Browser-Upload, mit denselben Einstellungen wie
+user_settings.
+
+    python image_cli.py ~/shooting --output ~/export --workers 8 --pro --text "© Studio"
+    python image_cli.py "raw/**/*.jpg" --output export --settings user_settings.json
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from PIL import Image
+
+from image_batch import DEFAULT_WORKERS, iter_batch, result_outputs
+from image_pipeline import ENCODER_PROFILES, EXPORT_PRESETS, OUTPUT_EXTENSIONS, OUTPUT_FORMATS
+from image_store import settings_digest
+
+# =============================================================================
+# CONSTANTS
+# =============================================================================
+
+# Defaults wie init_user_settings
+DEFAULT_SETTINGS = {
+    "watermark_text": "© CreatorOS",
+    "opacity": 180,
+    "padding": 50,
+    "output_format": "PNG",
+    "jpeg_quality": 85,
+    "is_pro": False,
+    "strip_only": False,
+    "encoder_profile": "balanced",
+    "export_preset": "original",
+}
+
+# Merkt sich pro Ausgabe Quelle und Einstellungen (für das Überspringen)
+MANIFEST_NAME = ".creatoros_manifest.json"
+
+# Manifest spätestens nach so vielen fertigen Bildern zwischenspeichern
+MANIFEST_SAVE_EVERY = 50
+
+# Dateiendungen, die Pillow lesen kann
+IMAGE_EXTENSIONS = {ext for ext, fmt in Image.registered_extensions().items() if fmt in Image.OPEN}
+
+# =============================================================================
+# EINGABEN
+# =============================================================================
+
+def collect_sources(inputs, recursive=False):
+    """Verzeichnisse, Globs und Dateien -> sortierte Liste (relativer_name, Path).
+
+    Der relative Name bestimmt den Pfad im Ausgabeverzeichnis: bei
+    Verzeichnissen relativ zum Verzeichnis, sonst nur der Dateiname.
+    """
+    sources = {}
+
+    def add(name, path):
+        name = Path(name).as_posix()
+        if name in sources and sources[name] != path:
+            raise ValueError(f"Mehrdeutiger Ausgabename: {name} ({sources[name]} und {path})")
+        sources[name] = path
+
+    for entry in inputs:
+        if os.path.isdir(entry):
+            pattern = "**/*" if recursive else "*"
+            for path in Path(entry).glob(pattern):
+                if path.is_file() and path.suffix.lower() in IMAGE_EXTENSIONS:
+                    add(path.relative_to(entry), path)
+        elif glob.has_magic(entry):
+            for match in glob.glob(entry, recursive=True):
+                path = Path(match)
+                if path.is_file() and path.suffix.lower() in IMAGE_EXTENSIONS:
+                    add(path.name, path)
+        elif os.path.isfile(entry):
+            add(Path(entry).name, Path(entry))
+        else:
+            raise ValueError(f"Eingabe nicht gefunden: {entry}")
+
+    return sorted(sources.items())
+
+
+def load_settings(path=None, **overrides):
+    """Einstellungen aus einem user_settings-Export (JSON) plus Überschreibungen"""
+    settings = dict(DEFAULT_SETTINGS)
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            row = json.load(f)
+        settings.update({key: row[key] for key in DEFAULT_SETTINGS if key in row})
+    settings.update({key: value for key, value in overrides.items() if value is not None})
+
+    # Mehrere Presets: ein Dekodieren, ein Ordner pro Preset
+    presets = settings.pop("export_presets", None) or [settings["export_preset"]]
+    settings["export_preset"] = presets[0]
+    if len(presets) > 1:
+        settings["export_presets"] = presets
+
+    # Free-User: fester Text, wie in der Content Factory
+    if not settings["is_pro"]:
+        settings["watermark_text"] = "Created with CreatorOS"
+        settings["strip_only"] = False
+    return settings
+
+# =============================================================================
+# MANIFEST
+# =============================================================================
+
+def _load_manifest(output_dir):
+    try:
+        with open(os.path.join(output_dir, MANIFEST_NAME), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_manifest(output_dir, manifest):
+    """Manifest atomar schreiben"""
+    fd, tmp_path = tempfile.mkstemp(prefix=".manifest-", dir=output_dir)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, os.path.join(output_dir, MANIFEST_NAME))
+
+
+def _fingerprint(path, settings_hash):
+    """Quelle (Größe, Änderungszeit) plus Einstellungen - ändert sich eins, ist die Ausgabe veraltet"""
+    stat = path.stat()
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "settings": settings_hash}
+
+
+def _is_up_to_date(output_dir, entry, fingerprint):
+    return (
+        entry is not None
+        and all(entry.get(key) == value for key, value in fingerprint.items())
+        and bool(entry.get("outputs"))
+        and all(os.path.isfile(os.path.join(output_dir, output)) for output in entry["outputs"])
+    )
+
+
+def _write_output(output_dir, name, data):
+    """Ausgabe atomar schreiben (abgebrochene Läufe hinterlassen keine halben Dateien)"""
+    target = os.path.join(output_dir, name)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=".", dir=os.path.dirname(target))
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, target)
+
+# =============================================================================
+# ENGINE
+# =============================================================================
+
+def process_sources(sources, output_dir, settings, workers=None, force=False, on_result=None):
+    """Verarbeitet (relativer_name, Path)-Paare nach output_dir.
+
+    Bereits aktuelle Ausgaben (gleiche Quelle, gleiche Einstellungen, Datei
+    vorhanden) werden übersprungen, außer mit force=True. Die Dateien werden
+    erst kurz vor der Verarbeitung gelesen, der Speicherbedarf hängt also
+    nicht von der Batch-Größe ab. Mehrere Presets landen in je einem
+    Unterordner. on_result(fertig, gesamt, name, ergebnis) wird pro Bild
+    aufgerufen. Gibt ein Dict mit processed, skipped und errors zurück.
+    """
+    if not settings.get("strip_only"):
+        # a.jpg und a.png würden beide zu a.<format>
+        stems = {}
+        for name, _ in sources:
+            stem = name.rsplit(".", 1)[0]
+            if stem in stems:
+                raise ValueError(f"Mehrdeutiger Ausgabename: {stems[stem]} und {name}")
+            stems[stem] = name
+
+    os.makedirs(output_dir, exist_ok=True)
+    settings = dict(settings, thumbnail=False)
+    settings_hash = settings_digest(settings)
+    manifest = _load_manifest(output_dir)
+
+    pending = []
+    fingerprints = {}
+    skipped = 0
+    for name, path in sources:
+        fingerprints[name] = _fingerprint(path, settings_hash)
+        if not force and _is_up_to_date(output_dir, manifest.get(name), fingerprints[name]):
+            skipped += 1
+        else:
+            pending.append((name, path))
+
+    processed = 0
+    errors = []
+    try:
+        # Das Manifest übernimmt das Überspringen - den Ausgabe-Cache der App
+        # würde die CLI nur mit Ergebnissen füllen, die sie nie wieder liest
+        for done, (idx, result) in enumerate(iter_batch(pending, settings, workers, use_cache=False), start=1):
+            name = pending[idx][0]
+            if 'error' in result:
+                errors.append({'source': name, 'error': result['error']})
+            else:
+                outputs = result_outputs(result)
+                for output in outputs:
+                    _write_output(output_dir, output['filename'], output['data'])
+                manifest[name] = dict(fingerprints[name], outputs=[output['filename'] for output in outputs])
+                processed += 1
+                if processed % MANIFEST_SAVE_EVERY == 0:
+                    _save_manifest(output_dir, manifest)
+            if on_result:
+                on_result(done, len(pending), name, result)
+    finally:
+        _save_manifest(output_dir, manifest)
+
+    return {"processed": processed, "skipped": skipped, "errors": errors}
+
+# =============================================================================
+# CLI
+# =============================================================================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="CreatorOS Content Factory - Batchverarbeitung ohne Browser")
+    parser.add_argument("inputs", nargs="+", help="Verzeichnisse, Dateien oder Globs (z.B. 'raw/**/*.jpg')")
+    parser.add_argument("-o", "--output", required=True, help="Ausgabeverzeichnis")
+    parser.add_argument("-r", "--recursive", action="store_true", help="Verzeichnisse rekursiv durchsuchen")
+    parser.add_argument("-w", "--workers", type=int, default=DEFAULT_WORKERS, help=f"Worker-Prozesse (Default {DEFAULT_WORKERS})")
+    parser.add_argument("--settings", help="user_settings als JSON (Export einer Tabellenzeile)")
+    parser.add_argument("--text", dest="watermark_text", help="Wasserzeichen-Text (nur PRO)")
+    parser.add_argument("--opacity", type=int, help="Deckkraft 0-255")
+    parser.add_argument("--padding", type=int, help="Abstand zwischen den Kacheln")
+    parser.add_argument("--format", dest="output_format", choices=OUTPUT_FORMATS, help="Ausgabeformat")
+    parser.add_argument("--quality", dest="jpeg_quality", type=int, help="Qualität für verlustbehaftete Formate")
+    parser.add_argument("--preset", dest="export_presets", action="append", choices=list(EXPORT_PRESETS), help="Export-Preset (Zielgröße); mehrfach angeben für mehrere Ausgaben aus einem Dekodieren")
+    parser.add_argument("--profile", dest="encoder_profile", choices=list(ENCODER_PROFILES), help="Encoder-Profil")
+    parser.add_argument("--pro", dest="is_pro", action="store_const", const=True, help="PRO-Einstellungen (eigener Text, Nur-EXIF)")
+    parser.add_argument("--strip-only", action="store_const", const=True, help="Nur Metadaten entfernen (PRO, verlustfrei)")
+    parser.add_argument("--force", action="store_true", help="Auch aktuelle Ausgaben neu berechnen")
+    args = parser.parse_args(argv)
+
+    try:
+        sources = collect_sources(args.inputs, args.recursive)
+        settings = load_settings(
+            args.settings,
+            watermark_text=args.watermark_text,
+            opacity=args.opacity,
+            padding=args.padding,
+            output_format=args.output_format,
+            jpeg_quality=args.jpeg_quality,
+            encoder_profile=args.encoder_profile,
+            export_presets=args.export_presets,
+            is_pro=args.is_pro,
+            strip_only=args.strip_only,
+        )
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+
+    if settings["output_format"] not in OUTPUT_EXTENSIONS:
+        parser.error(f"Unbekanntes Format: {settings['output_format']}")
+
+    def report(done, total, name, result):
+        status = f"FEHLER: {result['error']}" if 'error' in result else result['filename']
+        print(f"[{done}/{total}] {name} -> {status}", file=sys.stderr)
+
+    start = time.perf_counter()
+    try:
+        summary = process_sources(sources, args.output, settings, args.workers, args.force, report)
+    except ValueError as e:
+        parser.error(str(e))
+    elapsed = time.perf_counter() - start
+
+    print(
+        f"{summary['processed']} verarbeitet, {summary['skipped']} aktuell, "
+        f"{len(summary['errors'])} Fehler in {elapsed:.1f} s",
+        file=sys.stderr
+    )
+    return 1 if summary["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,175 @@
+"""
+CreatorOS - Image Jobs
+Batch-Ergebnisse der Content Factory auf lokaler Platte (mit Ablaufzeit),
+damit ein Rerun - z.B. durch den Download-Button - nichts neu berechnet
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from image_batch import build_zip_archive, result_outputs
+from image_pipeline import THUMBNAIL_EXTENSION
+
+# =============================================================================
+# CONSTANTS
+# =============================================================================
+
+JOB_DIR = os.environ.get("CREATOROS_JOB_DIR") or os.path.join(tempfile.gettempdir(), "creatoros_jobs")
+
+# Wie lange fertige Batches abrufbar bleiben
+JOB_TTL_SECONDS = int(os.environ.get("CREATOROS_JOB_TTL_MIN", 60)) * 60
+
+# Anzahl Thumbnails, die für die Galerie neben dem ZIP abgelegt werden
+GALLERY_SIZE = 4
+
+ARCHIVE_NAME = "archive.zip"
+META_NAME = "meta.json"
+
+# =============================================================================
+# JOB STORE
+# =============================================================================
+
+def batch_id(owner, digests, settings):
+    """Stabile Batch-ID aus Besitzer, Upload-Hashes und Einstellungen.
+
+    Gleiche Uploads mit gleichen Einstellungen landen immer beim selben Job,
+    ein Rerun hängt sich also automatisch wieder an.
+    """
+    payload = json.dumps([owner, list(digests), settings], sort_keys=True, default=str)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def job_path(job_id):
+    """Verzeichnis eines Jobs"""
+    return os.path.join(JOB_DIR, job_id)
+
+
+def purge_expired_jobs(now=None):
+    """Löscht alle Jobs, deren TTL abgelaufen ist.
+
+    Laufende Jobs (".<job_id>-..."-Verzeichnisse) frischen ihre mtime mit
+    jedem Bild auf und verfallen erst, wenn sie so lange kein Ergebnis mehr
+    geliefert haben (z.B. verwaist nach einem Absturz).
+    """
+    if not os.path.isdir(JOB_DIR):
+        return
+
+    now = now or time.time()
+    for name in os.listdir(JOB_DIR):
+        path = os.path.join(JOB_DIR, name)
+        try:
+            if now - os.path.getmtime(path) > JOB_TTL_SECONDS:
+                shutil.rmtree(path, ignore_errors=True)
+        except OSError:
+            continue
+
+
+def load_job(job_id):
+    """Metadaten eines fertigen, nicht abgelaufenen Jobs oder None"""
+    purge_expired_jobs()
+
+    meta_file = os.path.join(job_path(job_id), META_NAME)
+    try:
+        with open(meta_file, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    meta["archive_path"] = os.path.join(job_path(job_id), ARCHIVE_NAME)
+    for item in meta["gallery"]:
+        item["path"] = os.path.join(job_path(job_id), item["file"])
+    return meta
+
+
+def run_job(job_id, items, settings, workers=None, on_result=None, max_in_flight=None):
+    """Verarbeitet einen Batch genau einmal und legt das Ergebnis ab.
+
+    Das ZIP und die Galerie-Thumbnails werden direkt in ein temporäres
+    Job-Verzeichnis geschrieben, das erst nach Abschluss auf die Job-ID
+    umbenannt wird - halbfertige Jobs sind nie sichtbar. Existiert der Job
+    bereits, wird nur dessen Ergebnis geladen.
+
+    Wird der Lauf abgebrochen (z.B. durch einen Streamlit-Rerun), wird das
+    bis dahin Fertige als Teil-Job mit "partial": True abgelegt - das ZIP
+    ist dann bereits gültig. Ein erneuter Aufruf rechnet den Job zu Ende
+    (fertige Bilder kommen aus dem Ausgabe-Cache) und ersetzt den Teil-Job.
+    max_in_flight begrenzt die gleichzeitig eingereichten Bilder (siehe
+    iter_batch).
+    """
+    existing = load_job(job_id)
+    if existing is not None and not existing.get("partial"):
+        return existing
+
+    os.makedirs(JOB_DIR, exist_ok=True)
+    work_dir = tempfile.mkdtemp(prefix=f".{job_id}-", dir=JOB_DIR)
+    gallery = []
+    errors = []
+    encoding = {"seconds": 0.0, "process_seconds": 0.0, "bytes": 0, "cached": 0}
+    progress = {"done": 0}
+
+    def collect(done, total, idx, result):
+        progress["done"] = done
+        # Lebenszeichen für purge_expired_jobs: Schreiben ins ZIP ändert die
+        # mtime des Verzeichnisses nicht, ein langer Batch gälte sonst als abgelaufen
+        os.utime(work_dir)
+        if 'error' in result:
+            errors.append({'filename': result['filename'], 'error': result['error']})
+        else:
+            encoding["seconds"] += result['encode_seconds']
+            encoding["process_seconds"] += result['seconds']
+            encoding["bytes"] += sum(len(output['data']) for output in result_outputs(result))
+            encoding["cached"] += result.get('cached', False)
+        if 'error' not in result and idx < GALLERY_SIZE:
+            name = f"gallery_{idx}.{THUMBNAIL_EXTENSION}"
+            with open(os.path.join(work_dir, name), "wb") as f:
+                f.write(result['thumbnail'])
+            gallery.append({'idx': idx, 'filename': result['filename'], 'file': name})
+        if on_result:
+            on_result(done, total, idx, result)
+
+    def publish(partial):
+        meta = {
+            "job_id": job_id,
+            "created": time.time(),
+            "partial": partial,
+            "total": len(items),
+            "count": progress["done"] - len(errors),
+            "errors": errors,
+            "gallery": sorted(gallery, key=lambda item: item['idx']),
+            "archive_size": os.path.getsize(os.path.join(work_dir, ARCHIVE_NAME)),
+            "encode_seconds": encoding["seconds"],
+            "process_seconds": encoding["process_seconds"],
+            "output_bytes": encoding["bytes"],
+            "cached": encoding["cached"],
+        }
+        with open(os.path.join(work_dir, META_NAME), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+
+        if existing is not None:
+            # Teil-Job wird durch das neue Ergebnis ersetzt
+            shutil.rmtree(job_path(job_id), ignore_errors=True)
+        try:
+            os.rename(work_dir, job_path(job_id))
+        except OSError:
+            # Paralleler Rerun war schneller - dessen Ergebnis gilt
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    try:
+        with open(os.path.join(work_dir, ARCHIVE_NAME), "wb") as archive:
+            # Der ZIP-Kontext schließt das Archiv auch bei Abbruch sauber ab
+            build_zip_archive(items, settings, workers=workers, on_result=collect, out=archive, max_in_flight=max_in_flight)
+    except BaseException:
+        try:
+            if progress["done"] > len(errors):
+                publish(partial=True)
+        except OSError:
+            pass
+        shutil.rmtree(work_dir, ignore_errors=True)
+        raise
+
+    publish(partial=False)
+    return load_job(job_id)
@@ -0,0 +1,1275 @@
+"""
+CreatorOS - Image Pipeline
+Metadaten-Entfernung und Wasserzeichen für die Content Factory
+(ohne Streamlit-Abhängigkeit, damit auch außerhalb der Page nutzbar)
+"""
+
+import io
+import math
+import os
+import struct
+import time
+import warnings
+import zlib
+from functools import lru_cache
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont, ImageOps, features
+
+# =============================================================================
+# CONSTANTS
+# =============================================================================
+
+# Info-Keys, die Pixel-Semantik tragen und keine Metadaten sind
+PIXEL_INFO_KEYS = ("transparency",)
+
+# Ab dieser Pixelzahl läuft ein Bild im Band-Modus (Default 40 MP)
+BAND_MODE_MIN_PIXELS = int(float(os.environ.get("CREATOROS_BAND_MODE_MP", 40)) * 1_000_000)
+
+
+def image_pixels(fp):
+    """Pixelzahl laut Header - es wird nichts dekodiert"""
+    with Image.open(fp) as image:
+        width, height = image.size
+    if hasattr(fp, "seek"):
+        fp.seek(0)
+    return width * height
+
+
+def needs_band_mode(fp):
+    """True, wenn das Bild groß genug für den Band-Modus ist"""
+    return image_pixels(fp) >= BAND_MODE_MIN_PIXELS
+
+# =============================================================================
+# PROBE & ZULASSUNG (nur Header, es wird nichts dekodiert)
+# =============================================================================
+
+# Größere Bilder werden vor allem anderen auf diese Pixelzahl verkleinert
+MAX_INPUT_PIXELS = int(float(os.environ.get("CREATOROS_MAX_INPUT_MP", 100)) * 1_000_000)
+
+# Größere Bilder werden abgelehnt (auch Pillows Bombenschutz greift hier)
+REJECT_PIXELS = int(float(os.environ.get("CREATOROS_REJECT_MP", 250)) * 1_000_000)
+Image.MAX_IMAGE_PIXELS = REJECT_PIXELS
+
+# Gleichzeitig gehaltene Vollbild-Puffer je Bild (Dekodierung, Drehung,
+# Wasserzeichen) - im Band-Modus entfallen die meisten Kopien
+WORKING_COPIES = 3.0
+BAND_WORKING_COPIES = 1.5
+
+# Grober Durchsatz in Megapixel pro Sekunde und Kern (siehe
+# benchmark_pipeline.py): Dekodieren sowie Wasserzeichen + Encoding je Format
+DECODE_MEGAPIXELS_PER_SECOND = 50.0
+MEGAPIXELS_PER_SECOND = {"PNG": 4.5, "JPEG": 35.0, "WEBP": 10.0, "AVIF": 4.0}
+
+
+def probe_image(fp):
+    """Liest nur den Header: Format, Größe, Modus, Frames, EXIF-Drehung.
+
+    Gibt ein Dict zurück; bei unlesbaren Dateien oder Dekompressionsbomben
+    enthält es stattdessen 'error'.
+    """
+    try:
+        # Über REJECT_PIXELS entscheidet admit_image, nicht die Pillow-Warnung
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", Image.DecompressionBombWarning)
+            image = Image.open(fp)
+        with image:
+            orientation = header_orientation(image)
+            probe = {
+                "format": image.format,
+                "width": image.width,
+                "height": image.height,
+                "mode": image.mode,
+                "bands": len(image.getbands()),
+                "frames": getattr(image, "n_frames", 1),
+                "orientation": orientation,
+                "oriented_size": oriented_size(image, orientation),
+                "pixels": image.width * image.height,
+            }
+    except Image.DecompressionBombError:
+        probe = {"error": f"Zu groß (über {REJECT_PIXELS / 1_000_000:.0f} MP)"}
+    except (OSError, ValueError, SyntaxError):
+        probe = {"error": "Kein lesbares Bild"}
+    finally:
+        if hasattr(fp, "seek"):
+            fp.seek(0)
+    return probe
+
+
+def input_size(size):
+    """Größe nach der Eingangsbegrenzung auf MAX_INPUT_PIXELS"""
+    pixels = size[0] * size[1]
+    if pixels <= MAX_INPUT_PIXELS:
+        return size
+    scale = math.sqrt(MAX_INPUT_PIXELS / pixels)
+    return max(1, int(size[0] * scale)), max(1, int(size[1] * scale))
+
+
+def admit_image(probe, settings):
+    """Entscheidet vor dem Dekodieren, wie ein Bild verarbeitet wird.
+
+    action ist "reject" (zu groß/unlesbar), "downscale" (wird vorab auf
+    MAX_INPUT_PIXELS verkleinert), "band" (Band-Modus im Pool) oder "ok".
+    Dazu kommen geschätzter Spitzen-RAM (Bytes) und CPU-Zeit (Sekunden).
+    """
+    if "error" in probe:
+        return {"action": "reject", "reason": probe["error"], "memory_bytes": 0, "cpu_seconds": 0.0}
+    if probe["pixels"] > REJECT_PIXELS:
+        reason = f"{probe['pixels'] / 1_000_000:.0f} MP (max. {REJECT_PIXELS / 1_000_000:.0f} MP)"
+        return {"action": "reject", "reason": reason, "memory_bytes": 0, "cpu_seconds": 0.0}
+
+    if probe["pixels"] > MAX_INPUT_PIXELS:
+        action = "downscale"
+        reason = f"{probe['pixels'] / 1_000_000:.0f} MP → {MAX_INPUT_PIXELS / 1_000_000:.0f} MP"
+    elif probe["pixels"] >= BAND_MODE_MIN_PIXELS:
+        action, reason = "band", f"{probe['pixels'] / 1_000_000:.0f} MP"
+    else:
+        action, reason = "ok", ""
+
+    # Speicher: die Dekodierung läuft in voller Größe (außer JPEG-Draft),
+    # alles Weitere auf der Ausgabegröße
+    decode_pixels = probe["pixels"] if probe["format"] != "JPEG" else _area(input_size(probe["oriented_size"]))
+    output_pixels = sum(
+        _area(export_size(probe["oriented_size"], preset))
+        for preset in settings.get("export_presets") or [settings.get("export_preset")]
+    )
+    copies = BAND_WORKING_COPIES if action != "ok" else WORKING_COPIES
+    memory_bytes = int(decode_pixels * max(probe["bands"], 3) + output_pixels * 4 * (copies - 1))
+
+    if settings.get("strip_only"):
+        cpu_seconds = 0.0  # verlustfrei, ohne Dekodierung
+    else:
+        throughput = MEGAPIXELS_PER_SECOND.get(settings["output_format"], MEGAPIXELS_PER_SECOND["PNG"])
+        cpu_seconds = (decode_pixels / DECODE_MEGAPIXELS_PER_SECOND + output_pixels / throughput) / 1_000_000
+
+    return {"action": action, "reason": reason, "memory_bytes": memory_bytes, "cpu_seconds": cpu_seconds}
+
+# =============================================================================
+# METADATEN
+# =============================================================================
+
+def remove_metadata(image, in_place=False):
+    """Entfernt EXIF-Metadaten und korrigiert Rotation.
+
+    Arbeitet komplett auf Buffer-Ebene: exif_transpose liefert bereits eine
+    neue Bild-Instanz (gedreht oder kopiert), von der nur noch die Metadaten
+    abgeschnitten werden. Es entstehen keine Python-Objekte pro Pixel.
+    Mit in_place=True wird das übergebene Bild selbst bereinigt (keine Kopie,
+    solange keine Drehung nötig ist).
+    """
+    if in_place:
+        ImageOps.exif_transpose(image, in_place=True)
+        clean = image
+    else:
+        clean = ImageOps.exif_transpose(image)
+    clean.info = {key: clean.info[key] for key in PIXEL_INFO_KEYS if key in clean.info}
+    clean.getexif().clear()
+    return clean
+
+
+# Modi, die Pillow direkt verkleinern (reducing_gap) und kodieren kann
+EIGHT_BIT_MODES = ("1", "L", "LA", "RGB", "RGBA", "P", "CMYK")
+
+
+def to_8bit(image):
+    """Bringt Bilder in anderen Modi (16-Bit-PNG/TIFF, Gleitkomma, ...) auf 8 Bit.
+
+    I;16/I werden auf die oberen 8 Bit abgebildet - ein schlichtes
+    convert("L") schneidet 16-Bit-Werte bei 255 ab (weißes Bild). F wird auf
+    0-255 begrenzt, alle übrigen Modi gehen nach RGB(A). Die EXIF-Drehung
+    wird vorher angewendet, weil die Umwandlung die Metadaten verliert.
+    Bilder in EIGHT_BIT_MODES kommen unverändert (und undekodiert) zurück.
+    """
+    if image.mode in EIGHT_BIT_MODES:
+        return image
+    image = ImageOps.exif_transpose(image)
+    if image.mode.startswith("I"):
+        return Image.fromarray((np.asarray(image) >> 8).clip(0, 255).astype(np.uint8))
+    if image.mode == "F":
+        return image.convert("L")
+    return image.convert("RGBA" if _has_alpha(image) else "RGB")
+
+# =============================================================================
+# WASSERZEICHEN
+# =============================================================================
+
+FONT_PATHS = [
+    "arial.ttf",
+    "/System/Library/Fonts/Helvetica.ttc",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf",
+]
+
+WATERMARK_COLOR = (150, 150, 150)
+
+# Anzahl gecachter Wasserzeichen-Kacheln (pro Text/Größe/Deckkraft/Abstand eine
+# innere plus je eine pro Randzeile/-spalte, siehe watermark_edges)
+TILE_CACHE_SIZE = 64
+
+# Anzahl geladener Schriften (eine pro Pfad/Größen-Bucket)
+FONT_CACHE_SIZE = 16
+
+# Oberhalb dieser Größe wird die Schriftgröße auf FONT_SIZE_STEP gerundet,
+# damit ähnlich hohe Bilder dieselbe Schrift (und Kachel) teilen
+FONT_SIZE_EXACT_LIMIT = 32
+FONT_SIZE_STEP = 4
+
+# Logo-Wasserzeichen (PRO): Logohöhe relativ zur Bildhöhe, abgerundet auf
+# wenige Buckets - ein Batch skaliert das Logo so nur ein paar Mal
+LOGO_HEIGHT_RATIO = 0.08
+LOGO_HEIGHT_BUCKETS = (16, 24, 32, 48, 64, 96, 128, 192, 256, 384)
+
+# Größere Logos werden beim Dekodieren einmalig auf diese Kante verkleinert
+LOGO_MAX_EDGE = 1024
+
+# Logos mit mehr Pixeln werden gar nicht erst dekodiert (jeder Pool-Prozess
+# hält sein dekodiertes Logo im Speicher)
+LOGO_MAX_INPUT_PIXELS = int(float(os.environ.get("CREATOROS_LOGO_MAX_MP", 16)) * 1_000_000)
+
+# Anzahl dekodierter Logos pro Prozess
+LOGO_CACHE_SIZE = 4
+
+
+def _resolve_font_path():
+    """Sucht einmalig die erste ladbare Schrift aus FONT_PATHS"""
+    for font_path in FONT_PATHS:
+        try:
+            ImageFont.truetype(font_path, FONT_SIZE_EXACT_LIMIT)
+            return font_path
+        except:
+            continue
+
+    return None
+
+
+# Wird beim Import aufgelöst - einmal pro Prozess statt einmal pro Bild
+FONT_PATH = _resolve_font_path()
+
+
+def font_size_bucket(font_size):
+    """Rundet große Schriftgrößen auf den nächsten FONT_SIZE_STEP"""
+    font_size = max(font_size, 1)
+    if font_size <= FONT_SIZE_EXACT_LIMIT:
+        return font_size
+    return int(round(font_size / FONT_SIZE_STEP)) * FONT_SIZE_STEP
+
+
+@lru_cache(maxsize=FONT_CACHE_SIZE)
+def _cached_font(font_path, font_size):
+    """Parst eine Schrift genau einmal pro (Pfad, Größe)"""
+    if font_path is None:
+        return ImageFont.load_default()
+    return ImageFont.truetype(font_path, font_size)
+
+
+def get_font(font_size):
+    """Liefert die prozessweit gecachte Schrift für den Größen-Bucket"""
+    return _cached_font(FONT_PATH, font_size_bucket(font_size))
+
+
+def font_cache_stats():
+    """Treffer/Fehlschläge der Font-Registry (zur Kontrolle unter Last)"""
+    info = _cached_font.cache_info()
+    return {
+        "font_path": FONT_PATH,
+        "hits": info.hits,
+        "misses": info.misses,
+        "cached": info.currsize,
+        "max_cached": info.maxsize,
+    }
+
+
+def render_cache_stats():
+    """Treffer/Fehlschläge von Font-Registry und Kachel-Cache in diesem Prozess.
+
+    Die Caches leben pro Prozess - Pool-Worker geben diesen Stand mit jedem
+    Ergebnis zurück (pid unterscheidet die Prozesse, Zähler sind kumulativ).
+    """
+    font = _cached_font.cache_info()
+    tile = get_watermark_tile.cache_info()
+    return {
+        "pid": os.getpid(),
+        "font": {"hits": font.hits, "misses": font.misses},
+        "tile": {"hits": tile.hits, "misses": tile.misses},
+    }
+
+
+def _watermark_layout(text, font_size, padding):
+    """Schrift, Text-Bbox und Raster-Schritte (x_step, y_step) des Wasserzeichens"""
+    font = get_font(font_size)
+    bbox = font.getbbox(text)
+    x_step = max(bbox[2] - bbox[0] + padding, 1)
+    y_step = max(bbox[3] - bbox[1] + padding, 1)
+    return font, bbox, x_step, y_step
+
+
+def _wrap_steps(low, high, step):
+    """Alle k, für die ein Text bei k * step mit Ausdehnung [low, high) in die Kachel [0, step) reicht"""
+    return range(-high // step + 1, -(-(step - low) // step))
+
+
+def watermark_edges(text, font_size, padding):
+    """Anzahl der oberen Kachelzeilen und linken Kachelspalten mit eigener Kachel.
+
+    Dort fehlen beim Zeichnen pro Position die Texte oberhalb bzw. links
+    des Bildes, deren Glyphen in die Kachel ragen würden.
+    """
+    _, bbox, x_step, y_step = _watermark_layout(text, font_size, padding)
+    return (
+        max(0, -_wrap_steps(bbox[1], bbox[3], y_step).start),
+        max(0, -_wrap_steps(bbox[0], bbox[2], x_step).start),
+    )
+
+
+@lru_cache(maxsize=TILE_CACHE_SIZE)
+def get_watermark_tile(text, font_size, opacity, padding, row=None, col=None):
+    """Rastert den Text einmal in eine nahtlos kachelbare RGBA-Kachel.
+
+    Die Kachel ist genau ein Raster-Schritt groß. Glyphen, die über den Rand
+    ragen - auch um mehrere Schritte, z.B. bei "..." oder "_" mit kleinem
+    Abstand -, werden von jeder Raster-Position aus gezeichnet, die die Kachel
+    erreicht (in derselben Reihenfolge wie beim Zeichnen pro Position). So ist
+    das Muster beim Aneinanderlegen identisch zum Zeichnen pro Position.
+    row/col wählen die Variante für die Kachelzeile bzw. -spalte am oberen
+    bzw. linken Bildrand (siehe watermark_edges): dort entfallen Positionen
+    außerhalb des Bildes. None ist eine Kachel im Inneren.
+    Das Ergebnis wird prozessweit gecacht und darf nicht verändert werden.
+    """
+    font, bbox, x_step, y_step = _watermark_layout(text, font_size, padding)
+
+    tile = Image.new("RGBA", (x_step, y_step), (255, 255, 255, 0))
+    draw = ImageDraw.Draw(tile)
+    text_color = WATERMARK_COLOR + (opacity,)
+
+    for ky in _wrap_steps(bbox[1], bbox[3], y_step):
+        if row is not None and ky < -row:
+            continue
+        for kx in _wrap_steps(bbox[0], bbox[2], x_step):
+            if col is not None and kx < -col:
+                continue
+            draw.text((kx * x_step, ky * y_step), text, fill=text_color, font=font)
+
+    return tile
+
+
+@lru_cache(maxsize=TILE_CACHE_SIZE)
+def get_watermark_alpha(text, font_size, opacity, padding, row=None, col=None):
+    """Alpha-Kanal einer Kachel (siehe get_watermark_tile) als NumPy-Array"""
+    return np.asarray(get_watermark_tile(text, font_size, opacity, padding, row, col).getchannel("A"))
+
+
+def logo_height_bucket(image_height):
+    """Größter Bucket, der in LOGO_HEIGHT_RATIO der Bildhöhe passt (mindestens der kleinste)"""
+    target = image_height * LOGO_HEIGHT_RATIO
+    fitting = [bucket for bucket in LOGO_HEIGHT_BUCKETS if bucket <= target]
+    return fitting[-1] if fitting else LOGO_HEIGHT_BUCKETS[0]
+
+
+@lru_cache(maxsize=LOGO_CACHE_SIZE)
+def load_logo(path):
+    """Dekodiert ein Logo genau einmal pro Prozess und Pfad.
+
+    Gibt das Logo vormultipliziert (RGBa) zurück, damit beim Skalieren keine
+    dunklen Säume an transparenten Kanten entstehen. Das Ergebnis wird
+    prozessweit gecacht und darf nicht verändert werden.
+    """
+    with Image.open(path) as logo:
+        if logo.width * logo.height > LOGO_MAX_INPUT_PIXELS:
+            raise ValueError(f"Logo zu groß (über {LOGO_MAX_INPUT_PIXELS / 1_000_000:.0f} MP)")
+        logo = ImageOps.exif_transpose(logo).convert("RGBA")
+    if max(logo.size) > LOGO_MAX_EDGE:
+        logo.thumbnail((LOGO_MAX_EDGE, LOGO_MAX_EDGE), Image.Resampling.LANCZOS)
+    return logo.convert("RGBa")
+
+
+@lru_cache(maxsize=TILE_CACHE_SIZE)
+def get_logo_tile(path, logo_height, opacity, padding):
+    """Skaliert das Logo einmal pro Höhen-Bucket in eine kachelbare RGBA-Kachel.
+
+    Gegenstück zu get_watermark_tile: das Logo sitzt oben links, padding
+    rechts und unten ergibt den Raster-Schritt. Das Ergebnis wird
+    prozessweit gecacht und darf nicht verändert werden.
+    """
+    logo = load_logo(path)
+    logo_width = max(1, round(logo.width * logo_height / logo.height))
+    scaled = logo.resize((logo_width, logo_height), Image.Resampling.LANCZOS).convert("RGBA")
+    scaled.putalpha(scaled.getchannel("A").point(lambda value: value * opacity // 255))
+
+    tile = Image.new("RGBA", (logo_width + padding, logo_height + padding), (255, 255, 255, 0))
+    tile.paste(scaled, (0, 0))
+    return tile
+
+
+@lru_cache(maxsize=TILE_CACHE_SIZE)
+def get_logo_mask(path, logo_height, opacity, padding):
+    """Alpha und Farben der Logo-Kachel als NumPy-Arrays: (alpha, farben)"""
+    rgba = np.asarray(get_logo_tile(path, logo_height, opacity, padding))
+    return rgba[..., 3], rgba[..., :3]
+
+
+def _tile_row(edge_tiles, tile, width):
+    """Eine Kachelzeile über die ganze Breite: erst die Randkacheln, dann die innere Kachel"""
+    row = Image.new("RGBA", (width, tile.size[1]), (255, 255, 255, 0))
+    x = 0
+    for edge_tile in edge_tiles:
+        row.paste(edge_tile, (x, 0))
+        x += edge_tile.size[0]
+    for x in range(x, width, tile.size[0]):
+        row.paste(tile, (x, 0))
+    return row
+
+
+def _array_row(edge_tiles, tile, width):
+    """Wie _tile_row, für NumPy-Arrays (Alpha oder Farben)"""
+    remaining = max(0, width - sum(edge_tile.shape[1] for edge_tile in edge_tiles))
+    repeats = (1, -(-remaining // tile.shape[1])) + (1,) * (tile.ndim - 2)
+    return np.concatenate(list(edge_tiles) + [np.tile(tile, repeats)], axis=1)[:, :width]
+
+
+def _tile_overlay(rows, size):
+    """Legt die Kachelzeilen über die ganze Fläche.
+
+    rows sind Kachelzeilen auf Bildbreite: die ersten für die obersten
+    Zeilen des Bildes (Rand, siehe watermark_edges), die letzte für alle
+    weiteren.
+    """
+    width, height = size
+    *edge_rows, row = rows
+    tile_height = row.size[1]
+
+    overlay = Image.new("RGBA", size, (255, 255, 255, 0))
+    for y in range(0, height, tile_height):
+        index = y // tile_height
+        overlay.paste(edge_rows[index] if index < len(edge_rows) else row, (0, y))
+
+    return overlay
+
+
+def _paste_band(image, mask, fill, y):
+    """Mischt fill mit der Streifen-Maske ab Zeile y ein (unten abgeschnitten)"""
+    width, height = image.size
+    rows = min(mask.height, height - y)
+    if rows != mask.height:
+        mask = mask.crop((0, 0, width, rows))
+        if isinstance(fill, Image.Image):
+            fill = fill.crop((0, 0, width, rows))
+    image.paste(fill, (0, y, width, y + rows), mask)
+
+
+def _blend_tiled(image, rows, color):
+    """Blendet Kachelzeilen direkt in ein RGB-Bild (wird verändert).
+
+    rows sind Alpha-Masken der Kachelzeilen auf Bildbreite (wie bei
+    _tile_overlay: erst die Randzeilen, die letzte für alle weiteren). Die
+    Farbe wird pro Streifen mit der Maske in den RGB-Puffer gemischt.
+    Bearbeitet werden nur die Streifen, in denen Glyphen liegen - ohne
+    RGBA-Kopien und ohne Vollbild-Overlay. Entspricht alpha_composite über
+    deckendem Grund. color ist eine RGB-Farbe (Text) oder ein Farb-Array in
+    der Form der letzten Maske (Logo, ohne Randzeilen).
+    """
+    height = image.size[1]
+    tile_height = rows[-1].shape[0]
+
+    bands = []
+    for alpha in rows:
+        ink = np.flatnonzero(alpha.any(axis=1))
+        if ink.size == 0:
+            bands.append(None)
+            continue
+        top, bottom = int(ink[0]), int(ink[-1]) + 1
+        fill = color
+        if isinstance(color, np.ndarray):
+            fill = Image.fromarray(np.ascontiguousarray(color[top:bottom]))
+        bands.append((Image.fromarray(np.ascontiguousarray(alpha[top:bottom])), fill, top))
+
+    *edge_bands, band = bands
+    for index, edge_band in enumerate(edge_bands):
+        if edge_band is not None:
+            mask, fill, top = edge_band
+            _paste_band(image, mask, fill, index * tile_height + top)
+
+    if band is not None:
+        mask, fill, top = band
+        for y in range(len(edge_bands) * tile_height + top, height, tile_height):
+            _paste_band(image, mask, fill, y)
+
+
+def _composite_banded(image, rows):
+    """RGBA-Weg streifenweise (eine Kachelzeile pro Streifen).
+
+    Jeder Streifen wird einzeln nach RGBA gewandelt, mit der passenden
+    Overlay-Zeile (rows wie bei _tile_overlay) verrechnet und ins
+    RGB-Ergebnis kopiert. Das Muster bleibt über die Streifengrenzen
+    durchgehend, weil die Streifen genau auf dem Kachelraster liegen. Statt
+    mehrerer Vollbild-RGBA-Kopien liegt nur das Ergebnis plus ein Streifen
+    im RAM.
+    """
+    width, height = image.size
+    *edge_rows, overlay_row = rows
+    tile_height = overlay_row.size[1]
+    result = Image.new("RGB", image.size)
+
+    for y in range(0, height, tile_height):
+        box = (0, y, width, min(y + tile_height, height))
+        band = image.crop(box).convert("RGBA")
+        index = y // tile_height
+        row = edge_rows[index] if index < len(edge_rows) else overlay_row
+        overlay = row if band.height == tile_height else row.crop((0, 0, width, band.height))
+        result.paste(Image.alpha_composite(band, overlay).convert("RGB"), box[:2])
+
+    return result
+
+
+def _has_alpha(image):
+    """True, wenn das Bild (teil-)transparente Pixel haben kann"""
+    return "A" in image.getbands() or "transparency" in image.info
+
+
+def add_watermark(image, text, opacity, padding, is_pro, in_place=False, banded=False, logo=None):
+    """Fügt Wasserzeichen hinzu.
+
+    Mit in_place=True wird ein deckendes RGB-Bild direkt verändert (spart eine
+    Vollbild-Kopie, wenn der Aufrufer das Bild ohnehin nicht mehr braucht).
+    banded=True verarbeitet auch transparente Bilder streifenweise.
+    logo (Pfad, nur PRO) ersetzt den Text durch das Logo - gleiche Kachelung,
+    Logo und Kacheln kommen aus dem prozessweiten Cache.
+    """
+    # Free-User: Erzwinge CreatorOS Branding
+    if not is_pro:
+        text = "Created with CreatorOS"
+        logo = None
+
+    # Gekachelt (Tiled) - Text bzw. Logo wird nur einmal pro Einstellung gerastert.
+    # Oben und links fehlen beim Zeichnen pro Position die Texte außerhalb
+    # des Bildes - diese Randzeilen/-spalten bekommen eigene Kacheln
+    if logo:
+        tile_key = (logo, logo_height_bucket(image.height), opacity, padding)
+        edge_rows, edge_cols = 0, 0
+    else:
+        tile_key = (text, font_size_bucket(int(image.height * 0.05)), opacity, padding)
+        edge_rows, edge_cols = watermark_edges(*tile_key[:2], padding)
+    row_indices = list(range(edge_rows)) + [None]
+
+    # Transparente Bilder: klassisch über RGBA, damit Randpixel identisch bleiben
+    if _has_alpha(image):
+        if logo:
+            rows = [_tile_row([], get_logo_tile(*tile_key), image.width)]
+        else:
+            rows = [
+                _tile_row(
+                    [get_watermark_tile(*tile_key, row, col) for col in range(edge_cols)],
+                    get_watermark_tile(*tile_key, row),
+                    image.width
+                )
+                for row in row_indices
+            ]
+        if banded:
+            return _composite_banded(image, rows)
+        base_image = image.convert("RGBA")
+        overlay = _tile_overlay(rows, base_image.size)
+        final_image = Image.alpha_composite(base_image, overlay)
+        return final_image.convert("RGB")
+
+    # Deckende Bilder: direkt im RGB-Puffer, nur wo Glyphen liegen
+    if image.mode != "RGB":
+        final_image = image.convert("RGB")
+    else:
+        final_image = image if in_place else image.copy()
+    if logo:
+        alpha, color = get_logo_mask(*tile_key)
+        rows = [_array_row([], alpha, final_image.width)]
+        color = _array_row([], color, final_image.width)
+    else:
+        rows = [
+            _array_row(
+                [get_watermark_alpha(*tile_key, row, col) for col in range(edge_cols)],
+                get_watermark_alpha(*tile_key, row),
+                final_image.width
+            )
+            for row in row_indices
+        ]
+        color = WATERMARK_COLOR
+    _blend_tiled(final_image, rows, color)
+    return final_image
+
+# =============================================================================
+# VERLUSTFREIES STRIPPING (ohne Dekodierung)
+# =============================================================================
+
+JPEG_SOI = b"\xff\xd8"
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# PNG-Chunks, die für die Darstellung nötig sind - alles andere (eXIf, tEXt,
+# zTXt, iTXt, tIME, ...) fliegt raus
+PNG_KEEP_CHUNKS = {
+    b"IHDR", b"PLTE", b"IDAT", b"IEND",
+    b"tRNS", b"gAMA", b"cHRM", b"sRGB", b"iCCP", b"sBIT",
+    b"acTL", b"fcTL", b"fdAT",
+}
+
+EXIF_ORIENTATION = 0x0112
+
+
+def _orientation_tiff(orientation):
+    """Minimaler TIFF/EXIF-Block, der nur den Orientation-Tag enthält"""
+    return (
+        b"MM\x00\x2a\x00\x00\x00\x08"                     # Header, IFD0 bei Offset 8
+        + struct.pack(">H", 1)                            # 1 Eintrag
+        + struct.pack(">HHIHH", EXIF_ORIENTATION, 3, 1, orientation, 0)
+        + struct.pack(">I", 0)                            # kein weiteres IFD
+    )
+
+
+def _read_orientation(exif_bytes):
+    """Liest den Orientation-Tag aus rohen EXIF-Daten (1 = keine Drehung)"""
+    exif = Image.Exif()
+    try:
+        exif.load(exif_bytes)
+        return int(exif.get(EXIF_ORIENTATION, 1))
+    except Exception:
+        return 1
+
+
+def _jpeg_segments(data, pos):
+    """Liefert (marker, start, ende) aller Marker-Segmente bis inkl. EOI"""
+    size = len(data)
+    while pos + 1 < size:
+        if data[pos] != 0xFF:
+            raise ValueError("Ungültige JPEG-Struktur")
+        marker = data[pos + 1]
+        if marker == 0xFF:                                # Füllbytes
+            pos += 1
+            continue
+        if marker == 0xD9:                                # EOI
+            yield marker, pos, pos + 2
+            return
+        if 0xD0 <= marker <= 0xD7 or marker == 0x01:      # Marker ohne Länge
+            yield marker, pos, pos + 2
+            pos += 2
+            continue
+
+        if pos + 4 > size:
+            break
+        length = struct.unpack(">H", data[pos + 2:pos + 4])[0]
+        end = pos + 2 + length
+        if length < 2 or end > size:
+            raise ValueError("JPEG abgeschnitten")
+        if marker == 0xDA:                                # SOS: Entropie-Daten folgen
+            scan = end
+            while True:
+                scan = data.find(b"\xff", scan)
+                if scan < 0 or scan + 1 >= size:
+                    raise ValueError("JPEG ohne EOI")
+                follower = data[scan + 1]
+                if follower == 0x00 or 0xD0 <= follower <= 0xD7:
+                    scan += 2                             # Byte-Stuffing / Restart-Marker
+                    continue
+                break
+            end = scan
+        yield marker, pos, end
+        pos = end
+    raise ValueError("JPEG ohne EOI")
+
+
+def strip_jpeg(data, out):
+    """Entfernt EXIF, XMP, IPTC, Kommentare & Thumbnails aus einem JPEG.
+
+    Die Scan-Daten werden unverändert kopiert (kein Qualitätsverlust). Eine
+    EXIF-Drehung bleibt als minimaler Orientation-Tag erhalten. Alles nach dem
+    ersten EOI (z.B. eingebettete MPF-Vorschaubilder) wird verworfen.
+    data sind Bytes oder ein mmap - gelesen wird direkt daraus, ohne Kopie.
+    Teilansichten leben nur kurz, damit sich ein mmap danach schließen lässt.
+    """
+    if bytes(data[:2]) != JPEG_SOI:
+        raise ValueError("Kein JPEG")
+    if not hasattr(data, "find"):
+        data = bytes(data)  # _jpeg_segments sucht per find (bytes, mmap)
+
+    out.write(JPEG_SOI)
+    orientation = 1
+    header_written = False
+
+    with memoryview(data) as view:
+        for marker, start, end in _jpeg_segments(data, 2):
+            header = bytes(view[start + 4:min(end, start + 16)])   # Kennung des Segments
+
+            if marker == 0xE1:                                # APP1: EXIF / XMP
+                if header[:6] == b"Exif\x00\x00":
+                    orientation = _read_orientation(bytes(view[start + 4:end]))
+                continue
+            if marker == 0xE0:                                # APP0: JFIF ohne Thumbnail
+                if header[:5] == b"JFIF\x00" and len(header) >= 12:
+                    out.write(b"\xff\xe0\x00\x10")
+                    out.write(header[:12])
+                    out.write(b"\x00\x00")
+                continue
+            if marker == 0xE2 and header[:12] != b"ICC_PROFILE\x00":
+                continue                                      # APP2: nur ICC behalten
+            if 0xE3 <= marker <= 0xEF and marker != 0xEE:
+                continue                                      # APP3-15 (IPTC etc.) außer Adobe
+            if marker == 0xFE:                                # COM
+                continue
+
+            if not header_written and marker not in (0xE0, 0xE2, 0xEE):
+                # Orientation vor dem ersten Frame-/Tabellen-Segment einfügen
+                if orientation != 1:
+                    app1 = b"Exif\x00\x00" + _orientation_tiff(orientation)
+                    out.write(b"\xff\xe1" + struct.pack(">H", len(app1) + 2))
+                    out.write(app1)
+                header_written = True
+
+            out.write(view[start:end])
+
+
+def _png_chunk(chunk_type, payload):
+    """Baut einen PNG-Chunk inkl. CRC"""
+    crc = zlib.crc32(payload, zlib.crc32(chunk_type)) & 0xFFFFFFFF
+    return struct.pack(">I", len(payload)) + chunk_type + payload + struct.pack(">I", crc)
+
+
+def strip_png(data, out):
+    """Entfernt eXIf-, Text- und Zeit-Chunks aus einem PNG (verlustfrei).
+
+    data sind Bytes oder ein mmap (siehe strip_jpeg).
+    """
+    if bytes(data[:8]) != PNG_SIGNATURE:
+        raise ValueError("Kein PNG")
+
+    out.write(PNG_SIGNATURE)
+    orientation = 1
+    pos = 8
+    size = len(data)
+
+    with memoryview(data) as view:
+        while pos + 8 <= size:
+            length = struct.unpack(">I", view[pos:pos + 4])[0]
+            chunk_type = bytes(view[pos + 4:pos + 8])
+            end = pos + 12 + length
+            if end > size:
+                raise ValueError("PNG abgeschnitten")
+
+            if chunk_type == b"eXIf":
+                orientation = _read_orientation(bytes(view[pos + 8:pos + 8 + length]))
+            elif chunk_type in PNG_KEEP_CHUNKS:
+                if chunk_type in (b"IDAT", b"acTL") and orientation != 1:
+                    out.write(_png_chunk(b"eXIf", _orientation_tiff(orientation)))
+                    orientation = 1
+                out.write(view[pos:end])
+
+            pos = end
+            if chunk_type == b"IEND":
+                return
+
+    raise ValueError("PNG ohne IEND")
+
+
+def strip_metadata_lossless(data):
+    """Verlustfreies Entfernen der Metadaten direkt im Container.
+
+    Gibt (bytes, endung) zurück. Unbekannte Formate lösen ValueError aus,
+    damit der Aufrufer auf remove_metadata() zurückfallen kann.
+    """
+    out = io.BytesIO()
+    if bytes(data[:2]) == JPEG_SOI:
+        strip_jpeg(data, out)
+        return out.getvalue(), "jpg"
+    if bytes(data[:8]) == PNG_SIGNATURE:
+        strip_png(data, out)
+        return out.getvalue(), "png"
+    raise ValueError("Format nicht unterstützt")
+
+# =============================================================================
+# EXPORT
+# =============================================================================
+
+OUTPUT_EXTENSIONS = {"PNG": "png", "JPEG": "jpg", "WEBP": "webp", "AVIF": "avif"}
+
+# Formate, die der installierte Pillow-Build auch wirklich schreiben kann
+OUTPUT_FORMATS = ["PNG", "JPEG"] + [
+    output_format for output_format in ("WEBP", "AVIF") if features.check(output_format.lower())
+]
+
+# Encoder-Profile: CPU-Zeit gegen Dateigröße. "balanced" entspricht dem
+# bisherigen Verhalten (PNG Standard-Kompression, JPEG mit optimize)
+DEFAULT_ENCODER_PROFILE = "balanced"
+ENCODER_PROFILES = {
+    "fast": {
+        "png_compress_level": 1,
+        "jpeg_optimize": False,
+        "jpeg_progressive": False,
+        "jpeg_subsampling": "4:2:0",
+        "webp_method": 0,
+        "avif_speed": 10,
+    },
+    "balanced": {
+        "png_compress_level": 6,
+        "jpeg_optimize": True,
+        "jpeg_progressive": False,
+        "jpeg_subsampling": "4:2:0",
+        "webp_method": 4,
+        "avif_speed": 8,
+    },
+    "smallest": {
+        "png_compress_level": 9,
+        "jpeg_optimize": True,
+        "jpeg_progressive": True,
+        "jpeg_subsampling": "4:2:0",
+        "webp_method": 6,
+        "avif_speed": 4,
+    },
+}
+
+
+# Export-Presets: Zielbox (Breite, Höhe) nach der EXIF-Drehung. Das Bild
+# wird hineingepasst (kein Beschnitt) und nie hochskaliert
+DEFAULT_EXPORT_PRESET = "original"
+EXPORT_PRESETS = {
+    "original": None,
+    "feed": (1080, 1350),
+    "story": (1080, 1920),
+    "long_edge_2560": (2560, 2560),
+}
+
+# EXIF-Orientierungen, bei denen Breite und Höhe vertauscht werden
+SWAPPED_ORIENTATIONS = (5, 6, 7, 8)
+
+
+def fit_size(size, box):
+    """Größe, die in box passt (Seitenverhältnis bleibt, nie größer als size)"""
+    scale = min(box[0] / size[0], box[1] / size[1], 1.0)
+    return max(1, round(size[0] * scale)), max(1, round(size[1] * scale))
+
+
+def header_orientation(image):
+    """EXIF-Drehung nur aus dem Header, ohne zu dekodieren.
+
+    Pillow lädt bei PNGs ohne eXIf-Chunk vor IDAT für getexif() das ganze
+    Bild - dort zählt nur ein eXIf vor den Bilddaten, sonst gilt 1.
+    """
+    if image.format == "PNG":
+        exif = image.info.get("exif")
+        return _read_orientation(exif) if exif else 1
+    return image.getexif().get(EXIF_ORIENTATION, 1)
+
+
+def oriented_size(image, orientation=None):
+    """Bildgröße nach Anwendung der EXIF-Drehung.
+
+    Ohne orientation wird sie per getexif() gelesen (kann PNGs dekodieren,
+    siehe header_orientation).
+    """
+    if orientation is None:
+        orientation = image.getexif().get(EXIF_ORIENTATION)
+    if orientation in SWAPPED_ORIENTATIONS:
+        return image.height, image.width
+    return image.size
+
+
+def export_size(size, preset):
+    """Ausgabegröße eines (gedrehten) Bildes für ein Export-Preset (inkl. Eingangsbegrenzung)"""
+    size = input_size(size)
+    box = EXPORT_PRESETS.get(preset or DEFAULT_EXPORT_PRESET)
+    return fit_size(size, box) if box else size
+
+
+def resize_for_export(image, preset):
+    """Verkleinert ein frisch geöffnetes Bild direkt auf die Preset-Größe.
+
+    Läuft vor Drehung, Bereinigung und Wasserzeichen, damit alle weiteren
+    Schritte nur noch die Zielpixel sehen. JPEGs werden per Draft-Modus
+    schon beim Dekodieren reduziert, der Rest per reducing_gap. Die
+    EXIF-Drehung bleibt erhalten und wird danach wie gewohnt angewendet.
+    """
+    return _resize_unrotated(image, export_size(oriented_size(image), preset))
+
+
+def _resize_unrotated(image, target):
+    """Verkleinert ein noch nicht gedrehtes Bild auf target (Größe nach Drehung)"""
+    width, height = oriented_size(image)
+    target_width, target_height = target
+    if (target_width, target_height) == (width, height):
+        return image
+
+    # Zielgröße in der Ausrichtung der Rohdaten
+    if (width, height) != image.size:
+        target_width, target_height = target_height, target_width
+
+    image.draft(image.mode, (target_width, target_height))
+    if image.mode not in ("RGB", "RGBA", "L", "LA"):
+        # P/1/CMYK würden sonst nur mit NEAREST skaliert
+        image = image.convert("RGBA" if _has_alpha(image) else "RGB")
+    return image.resize((target_width, target_height), Image.Resampling.LANCZOS, reducing_gap=3.0)
+
+
+def encode_image(image, output_format, jpeg_quality=85, profile=DEFAULT_ENCODER_PROFILE):
+    """Kodiert ein Bild im Export-Format und gibt die Bytes zurück.
+
+    jpeg_quality gilt für alle verlustbehafteten Formate (JPEG, WebP, AVIF).
+    """
+    options = ENCODER_PROFILES[profile]
+    buf = io.BytesIO()
+    if output_format == "PNG":
+        image.save(buf, format="PNG", compress_level=options["png_compress_level"])
+    elif output_format == "WEBP":
+        image.save(buf, format="WEBP", quality=jpeg_quality, method=options["webp_method"])
+    elif output_format == "AVIF":
+        image.save(buf, format="AVIF", quality=jpeg_quality, speed=options["avif_speed"])
+    else:
+        image.save(
+            buf,
+            format="JPEG",
+            quality=jpeg_quality,
+            optimize=options["jpeg_optimize"],
+            progressive=options["jpeg_progressive"],
+            subsampling=options["jpeg_subsampling"]
+        )
+    return buf.getvalue()
+
+
+def benchmark_profiles(data, settings):
+    """Misst alle Encoder-Profile am fertig bearbeiteten Bild.
+
+    Dekodiert und bearbeitet das Bild einmal und kodiert es dann mit jedem
+    Profil. Gibt eine Liste von Dicts (profile, seconds, bytes) zurück.
+    """
+    final = _render_final(data, settings)
+    results = []
+    for profile in ENCODER_PROFILES:
+        start = time.perf_counter()
+        encoded = encode_image(final, settings["output_format"], settings.get("jpeg_quality", 85), profile)
+        results.append({
+            "profile": profile,
+            "seconds": time.perf_counter() - start,
+            "bytes": len(encoded),
+        })
+    return results
+
+
+def _area(size):
+    return size[0] * size[1]
+
+
+def _open_input(data):
+    """Öffnet Eingabe-Bytes oder ein gemapptes Dateiobjekt (mmap) ohne Kopie der Rohdaten"""
+    if hasattr(data, "seek"):
+        data.seek(0)
+        return to_8bit(Image.open(data))
+    return to_8bit(Image.open(io.BytesIO(data)))
+
+
+def process_outputs(data, settings):
+    """Ein Bild, mehrere Export-Presets (settings["export_presets"]).
+
+    Dekodiert und bereinigt nur einmal - JPEGs per Draft-Modus nur so groß
+    wie das größte Preset verlangt. Danach wird vom größten zum kleinsten
+    Preset jeweils aus der vorherigen Stufe verkleinert, mit Wasserzeichen
+    versehen und kodiert; der Aufwand folgt also den Ausgabepixeln, nicht der
+    Anzahl der Presets. Gibt ein Dict mit outputs (Liste aus preset, data,
+    ext in Preset-Reihenfolge), thumbnail, encode_seconds und seconds zurück.
+    """
+    started = time.perf_counter()
+    presets = list(dict.fromkeys(settings["export_presets"]))
+    output_format = settings["output_format"]
+
+    image = _open_input(data)
+    full_edge = max(image.size)
+    targets = {preset: export_size(oriented_size(image), preset) for preset in presets}
+
+    image = _resize_unrotated(image, max(targets.values(), key=_area))
+    cleaned = remove_metadata(image, in_place=True)
+    del image
+    if cleaned.mode not in ("RGB", "RGBA", "L", "LA"):
+        cleaned = cleaned.convert("RGBA" if _has_alpha(cleaned) else "RGB")
+
+    # Erst alle Größen vom größten zum kleinsten aus der jeweils vorherigen
+    # Stufe verkleinern, dann erst Wasserzeichen - so kann jede Stufe im
+    # eigenen Puffer markiert werden. Gleiche Zielgrößen teilen sich eine Ausgabe
+    bases = {}
+    current = cleaned
+    for target in sorted(set(targets.values()), key=_area, reverse=True):
+        if current.size != target:
+            current = current.resize(target, Image.Resampling.LANCZOS, reducing_gap=3.0)
+        bases[target] = current
+    del cleaned, current
+
+    encoded = {}
+    encode_seconds = 0.0
+    final = None
+    for target in sorted(bases, key=_area, reverse=True):
+        final = add_watermark(
+            bases.pop(target),
+            settings["watermark_text"],
+            settings["opacity"],
+            max(1, round(settings["padding"] * max(target) / full_edge)),
+            settings["is_pro"],
+            in_place=True,
+            banded=_area(target) >= BAND_MODE_MIN_PIXELS,
+            logo=settings.get("watermark_logo")
+        )
+
+        start = time.perf_counter()
+        encoded[target] = encode_image(
+            final,
+            output_format,
+            settings.get("jpeg_quality", 85),
+            settings.get("encoder_profile", DEFAULT_ENCODER_PROFILE)
+        )
+        encode_seconds += time.perf_counter() - start
+
+    # Thumbnail aus der kleinsten Ausgabe
+    thumbnail = make_thumbnail(final) if settings.get("thumbnail", True) else None
+    return {
+        "outputs": [
+            {"preset": preset, "data": encoded[targets[preset]], "ext": OUTPUT_EXTENSIONS[output_format]}
+            for preset in presets
+        ],
+        "thumbnail": thumbnail,
+        "encode_seconds": encode_seconds,
+        "seconds": time.perf_counter() - started,
+    }
+
+
+def process_image(data, settings):
+    """Kompletter Durchlauf für ein Bild: dekodieren → bereinigen → Wasserzeichen → kodieren.
+
+    data sind die Eingabe-Bytes oder ein mmap der Datei (wird direkt
+    gelesen, nicht auf den Heap kopiert). settings verwendet dieselben Keys wie user_settings bzw. der Session State
+    (watermark_text, opacity, padding, output_format, jpeg_quality, is_pro)
+    plus strip_only, encoder_profile, export_preset und watermark_logo (Pfad
+    eines Logos, nur PRO). Gibt ein Dict mit data, ext, thumbnail,
+    encode_seconds und seconds (gesamte Rechenzeit) zurück; mit
+    "thumbnail": False (z.B. in der CLI) bleibt thumbnail None.
+    Mit mehreren export_presets übernimmt process_outputs (Dict mit outputs
+    statt data/ext); Nur-EXIF bleibt immer eine einzelne, verlustfreie Ausgabe.
+    """
+    if len(settings.get("export_presets") or ()) > 1 and not settings.get("strip_only"):
+        return process_outputs(data, settings)
+
+    started = time.perf_counter()
+    with_thumbnail = settings.get("thumbnail", True)
+
+    if settings.get("strip_only"):
+        try:
+            stripped, ext = strip_metadata_lossless(data)
+            return {
+                "data": stripped,
+                "ext": ext,
+                "thumbnail": make_thumbnail(io.BytesIO(stripped)) if with_thumbnail else None,
+                "encode_seconds": 0.0,
+                "seconds": time.perf_counter() - started,
+            }
+        except ValueError:
+            pass  # Unbekanntes Format: dekodieren, aber ohne Wasserzeichen
+
+    final = _render_final(data, settings)
+
+    output_format = settings["output_format"]
+    start = time.perf_counter()
+    encoded = encode_image(
+        final,
+        output_format,
+        settings.get("jpeg_quality", 85),
+        settings.get("encoder_profile", DEFAULT_ENCODER_PROFILE)
+    )
+    encode_seconds = time.perf_counter() - start
+    thumbnail = make_thumbnail(final) if with_thumbnail else None
+    return {
+        "data": encoded,
+        "ext": OUTPUT_EXTENSIONS[output_format],
+        "thumbnail": thumbnail,
+        "encode_seconds": encode_seconds,
+        "seconds": time.perf_counter() - started,
+    }
+
+
+def _render_final(data, settings):
+    """Dekodieren → (Preset-Größe) → bereinigen → Wasserzeichen (ohne Encoding)"""
+    image = _open_input(data)
+    full_edge = max(image.size)
+
+    # Export-Preset (bzw. Eingangsbegrenzung): alles Weitere läuft nur noch
+    # auf den Zielpixeln; der Abstand skaliert mit, damit das Ergebnis wie
+    # verkleinert aussieht. Nur-EXIF behält die Originalgröße
+    preset = DEFAULT_EXPORT_PRESET if settings.get("strip_only") else settings.get("export_preset")
+    image = resize_for_export(image, preset)
+    padding = max(1, round(settings["padding"] * max(image.size) / full_edge))
+
+    # Band-Modus: keine Vollbild-Kopien mehr nach dem Dekodieren - Drehung
+    # und Bereinigung am Original, Wasserzeichen streifenweise
+    banded = image.width * image.height >= BAND_MODE_MIN_PIXELS
+    cleaned = remove_metadata(image, in_place=banded)
+    del image
+
+    if settings.get("strip_only"):
+        final = cleaned.convert("RGB")
+    else:
+        final = add_watermark(
+            cleaned,
+            settings["watermark_text"],
+            settings["opacity"],
+            padding,
+            settings["is_pro"],
+            in_place=True,
+            banded=banded,
+            logo=settings.get("watermark_logo")
+        )
+    return final
+
+# =============================================================================
+# VORSCHAU
+# =============================================================================
+
+# Lange Kante des Vorschau-Proxys in Pixeln
+PREVIEW_MAX_EDGE = 1280
+
+
+def open_proxy(fp, max_edge=PREVIEW_MAX_EDGE):
+    """Öffnet ein Bild direkt verkleinert und bereinigt.
+
+    JPEGs werden per Draft-Modus schon beim Dekodieren um 1/2-1/8 reduziert,
+    der Rest per reducing_gap skaliert (16-Bit/Gleitkomma vorher über to_8bit). Gibt (proxy, volle_größe) zurück,
+    die Größe bereits in EXIF-Drehung.
+    """
+    image = Image.open(fp)
+    full_size = oriented_size(image)
+    image.draft(image.mode, (max_edge, max_edge))
+    image = to_8bit(image)
+    image.thumbnail((max_edge, max_edge), Image.Resampling.BILINEAR, reducing_gap=2.0)
+    return remove_metadata(image), full_size
+
+
+def estimate_encoded_size(image, full_pixels, output_format, jpeg_quality=85, profile=DEFAULT_ENCODER_PROFILE):
+    """Schätzt die Dateigröße bei voller Auflösung aus zwei Proxy-Encodes.
+
+    Kodierte Bytes wachsen etwa mit pixel^k (k < 1, weil verkleinerte Bilder
+    mehr Details pro Pixel haben). k wird aus Proxy und halbem Proxy
+    bestimmt und auf die volle Pixelzahl hochgerechnet.
+    Gibt (geschätzte_bytes, proxy_bytes) zurück.
+    """
+    encoded = encode_image(image, output_format, jpeg_quality, profile)
+    half = image.resize((max(1, image.width // 2), max(1, image.height // 2)), Image.Resampling.BOX)
+    half_size = len(encode_image(half, output_format, jpeg_quality, profile))
+
+    proxy_pixels = image.width * image.height
+    half_pixels = half.width * half.height
+    exponent = 1.0
+    if half_size and len(encoded) > half_size and proxy_pixels > half_pixels:
+        exponent = math.log(len(encoded) / half_size) / math.log(proxy_pixels / half_pixels)
+        exponent = min(max(exponent, 0.5), 1.0)
+
+    estimate = len(encoded) * (max(full_pixels, proxy_pixels) / proxy_pixels) ** exponent
+    return int(estimate), encoded
+
+
+def render_preview(proxy, full_size, settings):
+    """Rendert die Wasserzeichen-Vorschau auf einem Proxy aus open_proxy().
+
+    Das Wasserzeichen wird passend skaliert (Schrift hängt ohnehin an der
+    Bildhöhe, der Abstand wird mitskaliert). Mit Export-Preset wird der
+    Proxy höchstens so groß wie die Ausgabe. Gibt (vorschau,
+    geschätzte_bytes, ausgabe_größe) zurück.
+    """
+    output_size = export_size(full_size, settings.get("export_preset"))
+    if max(proxy.size) > max(output_size):
+        proxy = proxy.resize(fit_size(proxy.size, output_size), Image.Resampling.LANCZOS, reducing_gap=3.0)
+    scale = max(proxy.size) / max(full_size)
+
+    preview = add_watermark(
+        proxy,
+        settings["watermark_text"],
+        settings["opacity"],
+        max(1, round(settings["padding"] * scale)),
+        settings["is_pro"],
+        logo=settings.get("watermark_logo")
+    )
+
+    estimate, _ = estimate_encoded_size(
+        preview,
+        output_size[0] * output_size[1],
+        settings["output_format"],
+        settings.get("jpeg_quality", 85),
+        settings.get("encoder_profile", DEFAULT_ENCODER_PROFILE)
+    )
+    return preview, estimate, output_size
+
+# =============================================================================
+# THUMBNAILS
+# =============================================================================
+
+# Galerie und Original-Vorschau bekommen nur diese kleinen Bilder zu sehen
+THUMBNAIL_MAX_EDGE = 480
+THUMBNAIL_QUALITY = 80
+THUMBNAIL_FORMAT = "WEBP" if features.check("webp") else "JPEG"
+THUMBNAIL_EXTENSION = "webp" if THUMBNAIL_FORMAT == "WEBP" else "jpg"
+
+
+def make_thumbnail(source, max_edge=THUMBNAIL_MAX_EDGE):
+    """Erzeugt ein kleines WebP/JPEG (ohne Metadaten) als Bytes.
+
+    source ist entweder ein bereits dekodiertes Bild (z.B. das fertige
+    Ergebnis) oder eine Datei - dann wird per Draft-Modus direkt klein
+    dekodiert.
+    """
+    if isinstance(source, Image.Image):
+        scale = min(1.0, max_edge / max(source.size))
+        size = (max(1, round(source.width * scale)), max(1, round(source.height * scale)))
+        thumb = source.resize(size, Image.Resampling.BILINEAR, reducing_gap=2.0)
+    else:
+        thumb, _ = open_proxy(source, max_edge)
+
+    if thumb.mode not in ("RGB", "RGBA") or THUMBNAIL_FORMAT == "JPEG":
+        thumb = thumb.convert("RGBA" if "A" in thumb.getbands() and THUMBNAIL_FORMAT != "JPEG" else "RGB")
+
+    buf = io.BytesIO()
+    thumb.save(buf, format=THUMBNAIL_FORMAT, quality=THUMBNAIL_QUALITY)
+    return buf.getvalue()
+
+# =============================================================================
+# DUPLIKATE
+# =============================================================================
+
+# dHash über ein 9x8-Graustufenbild = 64 Bit
+PHASH_BITS = 64
+
+# Lange Kante der Dekodierung für den Hash (JPEGs per Draft-Modus)
+PHASH_DECODE_EDGE = 64
+
+# Voreinstellung: ab 85 % gleichen Bits gelten Bilder als Duplikate
+DEFAULT_DUPLICATE_SIMILARITY = 0.85
+
+
+def perceptual_hash(fp):
+    """64-Bit-Differenz-Hash (dHash) aus einer stark verkleinerten Dekodierung.
+
+    Helligkeitsverläufe zwischen Nachbarpixeln statt der Pixel selbst -
+    robust gegen Skalierung, Kompression und leichte Belichtungsänderungen.
+    Die EXIF-Drehung wird vorher angewendet.
+    """
+    proxy, _ = open_proxy(fp, PHASH_DECODE_EDGE)
+    small = proxy.convert("L").resize((9, 8), Image.Resampling.BOX)
+    pixels = np.asarray(small, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def max_hash_distance(similarity):
+    """Ähnlichkeit (0-1) -> maximale Anzahl abweichender Hash-Bits"""
+    return int(round((1.0 - similarity) * PHASH_BITS))
+
+
+def group_duplicates(hashes, max_distance):
+    """Gruppiert Indizes, deren Hashes höchstens max_distance Bits abweichen.
+
+    Jedes Bild wird mit dem ersten Bild jeder bestehenden Gruppe verglichen
+    (Serienbilder driften so nicht über viele Frames zusammen). Gibt eine
+    Liste von Index-Listen in Upload-Reihenfolge zurück.
+    """
+    groups = []
+    for idx, value in enumerate(hashes):
+        for group in groups:
+            if (hashes[group[0]] ^ value).bit_count() <= max_distance:
+                group.append(idx)
+                break
+        else:
+            groups.append([idx])
+    return groups
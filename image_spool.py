@@ -0,0 +1,136 @@
+"""
+CreatorOS - Image Spool
+Uploads der Content Factory einmal auf lokale Platte schreiben und danach
+nur noch per mmap lesen - rohe Bytes belegen so Page-Cache statt Python-Heap
+"""
+
+import hashlib
+import io
+import mmap
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+
+# =============================================================================
+# CONSTANTS
+# =============================================================================
+
+SPOOL_DIR = os.environ.get("CREATOROS_SPOOL_DIR") or os.path.join(tempfile.gettempdir(), "creatoros_spool")
+
+# Ungenutzte Uploads verfallen wie fertige Batches (siehe Datenschutzhinweis)
+SPOOL_TTL_SECONDS = int(os.environ.get("CREATOROS_JOB_TTL_MIN", 60)) * 60
+
+# =============================================================================
+# GESPOOLTE UPLOADS
+# =============================================================================
+
+class SpooledUpload(os.PathLike):
+    """Upload auf Platte: Name, Größe und Inhalts-Hash wie beim Hochladen.
+
+    Ist ein Pfad (os.PathLike) - iter_batch und die Warteschlange lesen
+    ihn erst bei Bedarf, im Pool-Worker statt im Streamlit-Prozess.
+    """
+
+    def __init__(self, name, path, size, digest):
+        self.name = name
+        self.path = path
+        self.size = size
+        self.digest = digest
+
+    def __fspath__(self):
+        return self.path
+
+    def refresh(self):
+        """Verlängert die Lebensdauer; False, wenn die Datei schon aufgeräumt wurde"""
+        try:
+            os.utime(self.path)
+            return True
+        except OSError:
+            return False
+
+    def read_bytes(self):
+        with open(self.path, "rb") as f:
+            return f.read()
+
+
+def _owner_dir(owner):
+    # Kein Klartext (E-Mail) im Dateisystem
+    return os.path.join(SPOOL_DIR, hashlib.blake2b(owner.encode("utf-8"), digest_size=8).hexdigest())
+
+
+def spool_upload(owner, file):
+    """Schreibt ein UploadedFile einmal nach SPOOL_DIR und gibt ein SpooledUpload zurück.
+
+    Inhaltsadressiert pro Besitzer: derselbe Upload landet immer in derselben
+    Datei, neue Einstellungen (und damit eine neue Batch-ID) spoolen nichts
+    neu. Gehasht und geschrieben wird direkt aus dem Upload-Puffer, ohne
+    Kopie auf dem Heap.
+    """
+    buffer = file.getbuffer()
+    digest = hashlib.blake2b(buffer, digest_size=16).hexdigest()
+    directory = _owner_dir(owner)
+    path = os.path.join(directory, digest)
+
+    if not os.path.exists(path):
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=".", dir=directory)
+        with os.fdopen(fd, "wb") as f:
+            f.write(buffer)
+        os.replace(tmp_path, path)
+    buffer.release()
+
+    upload = SpooledUpload(file.name, path, file.size, digest)
+    upload.refresh()
+    return upload
+
+
+def purge_expired_spools(now=None):
+    """Löscht Uploads, die seit der TTL nicht mehr benutzt wurden"""
+    if not os.path.isdir(SPOOL_DIR):
+        return
+
+    deadline = (now or time.time()) - SPOOL_TTL_SECONDS
+    for owner in os.listdir(SPOOL_DIR):
+        directory = os.path.join(SPOOL_DIR, owner)
+        try:
+            for name in os.listdir(directory):
+                path = os.path.join(directory, name)
+                if os.path.getmtime(path) < deadline:
+                    os.remove(path)
+            if not os.listdir(directory):
+                shutil.rmtree(directory, ignore_errors=True)
+        except OSError:
+            continue
+
+# =============================================================================
+# MMAP-ZUGRIFF
+# =============================================================================
+
+@contextmanager
+def map_file(path):
+    """Datei als schreibgeschütztes mmap (Dateiobjekt und Puffer zugleich)"""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield io.BytesIO(b"")  # leere Dateien lassen sich nicht mappen
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield mapped
+
+
+@contextmanager
+def open_upload(upload):
+    """Lesbares Dateiobjekt eines Uploads: mmap für gespoolte, sonst der Upload selbst"""
+    if isinstance(upload, os.PathLike):
+        with map_file(upload) as fp:
+            yield fp
+    else:
+        upload.seek(0)
+        yield upload
+
+
+def call_mapped(fn, path):
+    """fn(dateiobjekt) auf einer gemappten Datei - im Pool-Worker aufrufbar"""
+    with map_file(path) as fp:
+        return fn(fp)
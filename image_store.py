@@ -0,0 +1,204 @@
+"""
+CreatorOS - Image Store
+Inhaltsadressierter Platten-Cache fertig kodierter Bilder, damit ein erneut
+hochgeladener Batch mit gleichen Einstellungen nicht neu berechnet wird
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+# =============================================================================
+# CONSTANTS
+# =============================================================================
+
+OUTPUT_CACHE_DIR = os.environ.get("CREATOROS_OUTPUT_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "creatoros_outputs")
+
+# Plattenbudget für kodierte Ausgaben samt Thumbnails
+OUTPUT_CACHE_MAX_BYTES = int(os.environ.get("CREATOROS_OUTPUT_CACHE_MB", 1024)) * 1024 * 1024
+
+# Maximales Alter eines Eintrags (wie die Job-TTL, siehe Datenschutzhinweis)
+OUTPUT_CACHE_TTL_SECONDS = int(os.environ.get("CREATOROS_OUTPUT_CACHE_TTL_MIN", 60)) * 60
+
+# Bei Änderungen an der Pipeline erhöhen - alte Einträge werden dann nie mehr getroffen
+OUTPUT_CACHE_VERSION = 1
+
+THUMBNAIL_SUFFIX = "thumb"
+
+# =============================================================================
+# SCHLÜSSEL
+# =============================================================================
+
+def _file_digest(path):
+    with open(path, "rb") as f:
+        return hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+
+
+def settings_digest(settings):
+    """Hash der Pipeline-Einstellungen (unabhängig von der Schlüssel-Reihenfolge).
+
+    Ein Logo zählt mit seinem Inhalt, nicht mit seinem Pfad - die
+    Warteschlange verlinkt es pro Job an eine eigene Stelle.
+    """
+    if settings.get("watermark_logo"):
+        try:
+            settings = {**settings, "watermark_logo": _file_digest(settings["watermark_logo"])}
+        except OSError:
+            pass
+    payload = json.dumps([OUTPUT_CACHE_VERSION, settings], sort_keys=True, default=str)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def output_key(data, settings_hash):
+    """Cache-Schlüssel aus Hash der Eingabe-Bytes und Hash der Einstellungen"""
+    return hashlib.blake2b(data, digest_size=16).hexdigest() + settings_hash
+
+# =============================================================================
+# OUTPUT STORE
+# =============================================================================
+
+class OutputStore:
+    """Größenbegrenzter LRU-Cache auf Platte.
+
+    Jeder Eintrag besteht aus "<schlüssel>.<endung>" (kodiertes Bild) und
+    "<schlüssel>.thumb" (Galerie-Thumbnail). Der Index liegt im RAM und wird
+    beim ersten Zugriff aus den Dateinamen aufgebaut. Verdrängt wird nach
+    letzter Nutzung, gelöscht spätestens ttl Sekunden nach dem Schreiben -
+    ein Treffer verlängert die Lebensdauer nicht. Dateien werden atomar
+    geschrieben, halbfertige Einträge sind nie sichtbar.
+    """
+
+    def __init__(self, directory, max_bytes, ttl):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = None
+        self._lock = threading.Lock()
+
+    def _path(self, key, suffix):
+        return os.path.join(self.directory, f"{key}.{suffix}")
+
+    def _load_index(self):
+        """Index aus dem Cache-Verzeichnis aufbauen (nur beim ersten Zugriff)"""
+        if self._entries is not None:
+            return
+
+        found = {}
+        if os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                key, _, suffix = name.partition(".")
+                if not suffix or name.startswith("."):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(self.directory, name))
+                except OSError:
+                    continue
+                entry = found.setdefault(key, {"ext": None, "size": 0, "mtime": 0})
+                entry["size"] += stat.st_size
+                entry["mtime"] = max(entry["mtime"], stat.st_mtime)
+                if suffix != THUMBNAIL_SUFFIX:
+                    entry["ext"] = suffix
+
+        self._entries = OrderedDict()
+        for key, entry in sorted(found.items(), key=lambda item: item[1]["mtime"]):
+            if entry["ext"] is None:
+                continue  # verwaister Thumbnail-Rest
+            self._entries[key] = (entry["ext"], entry["size"], entry["mtime"])
+            self.current_bytes += entry["size"]
+
+    def _purge_expired(self):
+        """Entfernt alle Einträge, deren TTL abgelaufen ist"""
+        self._load_index()
+        deadline = time.time() - self.ttl
+        for key in [key for key, entry in self._entries.items() if entry[2] < deadline]:
+            self._remove(key)
+
+    def _remove(self, key):
+        ext, size, _ = self._entries.pop(key)
+        self.current_bytes -= size
+        for suffix in (ext, THUMBNAIL_SUFFIX):
+            try:
+                os.remove(self._path(key, suffix))
+            except OSError:
+                pass
+
+    def get(self, key):
+        """Dict mit 'data', 'ext' und 'thumbnail' oder None"""
+        with self._lock:
+            self._purge_expired()
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            ext = entry[0]
+            try:
+                with open(self._path(key, ext), "rb") as f:
+                    data = f.read()
+                with open(self._path(key, THUMBNAIL_SUFFIX), "rb") as f:
+                    thumbnail = f.read()
+            except OSError:
+                # Von außen gelöscht (z.B. tmp-Aufräumen) - wie ein Fehlschlag behandeln
+                self._remove(key)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return {"data": data, "ext": ext, "thumbnail": thumbnail}
+
+    def put(self, key, data, ext, thumbnail):
+        """Legt ein kodiertes Bild samt Thumbnail ab und verdrängt alte Einträge"""
+        size = len(data) + len(thumbnail)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            self._purge_expired()
+            if key in self._entries:
+                self._remove(key)
+
+            os.makedirs(self.directory, exist_ok=True)
+            try:
+                for suffix, content in ((THUMBNAIL_SUFFIX, thumbnail), (ext, data)):
+                    fd, tmp_path = tempfile.mkstemp(prefix=".", dir=self.directory)
+                    with os.fdopen(fd, "wb") as f:
+                        f.write(content)
+                    os.replace(tmp_path, self._path(key, suffix))
+            except OSError:
+                return  # Platte voll o.ä. - der Cache ist nur eine Abkürzung
+
+            self._entries[key] = (ext, size, time.time())
+            self.current_bytes += size
+
+            while self.current_bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def purge_expired(self):
+        """Abgelaufene Einträge löschen, auch ohne Zugriff (periodisch vom Worker)"""
+        with self._lock:
+            self._purge_expired()
+
+    def stats(self):
+        """Treffer, Fehlschläge, Trefferquote und Belegung"""
+        with self._lock:
+            self._purge_expired()
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+output_store = OutputStore(OUTPUT_CACHE_DIR, OUTPUT_CACHE_MAX_BYTES, OUTPUT_CACHE_TTL_SECONDS)
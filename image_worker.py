@@ -0,0 +1,563 @@
+"""
+CreatorOS - Image Worker
+Eigenständiger Worker-Prozess für die Content Factory: Batches landen über
+eine lokale Warteschlange auf Platte hier, die Page reicht nur ein und
+fragt den Status ab. So hält kein Bild-Batch den GIL des Streamlit-Servers.
+
+    python image_worker.py          # Dienst manuell starten (sonst startet ihn die Page)
+"""
+
+import fcntl
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from image_jobs import JOB_TTL_SECONDS, load_job, purge_expired_jobs, run_job
+from image_batch import DEFAULT_WORKERS, IN_FLIGHT_PER_WORKER, result_outputs
+from image_spool import purge_expired_spools
+from image_store import output_store
+
+# =============================================================================
+# CONSTANTS
+# =============================================================================
+
+QUEUE_DIR = os.environ.get("CREATOROS_QUEUE_DIR") or os.path.join(tempfile.gettempdir(), "creatoros_queue")
+
+# Page startet den Worker selbst, falls keiner läuft (0 = extern betrieben)
+WORKER_AUTOSTART = os.environ.get("CREATOROS_WORKER_AUTOSTART", "1") != "0"
+
+# Ohne Lebenszeichen seit so vielen Sekunden gilt der Worker als tot
+WORKER_STALE_SECONDS = 15
+HEARTBEAT_SECONDS = 2
+POLL_SECONDS = 0.5
+
+# So oft räumt der Worker abgelaufene Uploads, Jobs und Cache-Einträge weg -
+# auch wenn niemand mehr die App öffnet (siehe Datenschutzhinweis)
+PURGE_INTERVAL_SECONDS = 60
+
+# So viele fertige Bilder legt der Worker sofort zum Abruf ab (Live-Ergebnisse)
+LIVE_RESULTS_MAX = 24
+
+# Gleichzeitig laufende Jobs im Worker (sie teilen sich einen Prozess-Pool)
+WORKER_JOB_SLOTS = int(os.environ.get("CREATOROS_WORKER_JOBS", 3))
+
+# Ein Job, der den Worker so oft mitten im Lauf abstürzen ließ, gilt als fehlgeschlagen
+WORKER_MAX_ATTEMPTS = int(os.environ.get("CREATOROS_WORKER_MAX_ATTEMPTS", 3))
+
+# Grenzen pro Plan: laufende Jobs insgesamt und gleichzeitig eingereichte
+# Bilder pro Job (der Anteil am Pool)
+PLAN_LIMITS = {
+    "pro": {
+        "jobs": int(os.environ.get("CREATOROS_PRO_JOBS", 2)),
+        "in_flight": int(os.environ.get("CREATOROS_PRO_IN_FLIGHT", 0)) or DEFAULT_WORKERS * IN_FLIGHT_PER_WORKER,
+    },
+    "free": {
+        "jobs": int(os.environ.get("CREATOROS_FREE_JOBS", 1)),
+        "in_flight": int(os.environ.get("CREATOROS_FREE_IN_FLIGHT", 0)) or max(1, DEFAULT_WORKERS // 2),
+    },
+}
+
+# FREE-Jobs, die so lange warten, rücken in die PRO-Spur auf (kein Verhungern)
+PRIORITY_MAX_WAIT_SECONDS = int(os.environ.get("CREATOROS_PRIORITY_MAX_WAIT_S", 120))
+
+# Anzahl gestarteter Jobs, über die Wartezeit-Perzentile berechnet werden
+WAIT_HISTORY_SIZE = 200
+
+REQUEST_NAME = "request.json"
+STATUS_NAME = "status.json"
+CANCEL_NAME = "cancel"
+LOCK_NAME = "worker.lock"
+HEARTBEAT_NAME = "worker.heartbeat"
+METRICS_NAME = "metrics.json"
+LOG_NAME = "worker.log"
+LOGO_NAME = "logo"
+
+# Größeres Worker-Log wird beim nächsten Start nach worker.log.1 rotiert
+WORKER_LOG_MAX_BYTES = 5 * 1024 * 1024
+
+
+# Letzter Stand von render_cache_stats pro rechnendem Prozess (pid) - kommt
+# mit jedem Ergebnis aus dem Pool, die Caches der Pool-Worker sind sonst unsichtbar
+_render_caches = {}
+_render_caches_lock = threading.Lock()
+
+
+class JobCancelled(Exception):
+    """Der Nutzer hat den Batch angehalten"""
+
+# =============================================================================
+# HILFSFUNKTIONEN
+# =============================================================================
+
+def _entry_path(job_id):
+    return os.path.join(QUEUE_DIR, job_id)
+
+
+def _write_json(path, payload):
+    """JSON atomar schreiben (Leser sehen nie halbe Dateien)"""
+    fd, tmp_path = tempfile.mkstemp(prefix=".", dir=os.path.dirname(path))
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(payload, f)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _link_or_copy(source, target):
+    """Hardlink (kostet keinen Platz), über Dateisystemgrenzen hinweg Kopie"""
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
+
+
+def _plan(settings):
+    return "pro" if settings.get("is_pro") else "free"
+
+
+def _queued_requests():
+    """Alle wartenden Aufträge (noch nicht gestartet)"""
+    requests = []
+    if not os.path.isdir(QUEUE_DIR):
+        return requests
+    for name in os.listdir(QUEUE_DIR):
+        entry = os.path.join(QUEUE_DIR, name)
+        if name.startswith(".") or not os.path.isdir(entry):
+            continue
+        status = _read_json(os.path.join(entry, STATUS_NAME))
+        if status is not None and status["state"] != "queued":
+            continue
+        request = _read_json(os.path.join(entry, REQUEST_NAME))
+        if request is not None:
+            requests.append(request)
+    return requests
+
+
+def _percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+# =============================================================================
+# PAGE-SEITE: EINREICHEN & ABFRAGEN
+# =============================================================================
+
+def submit_job(job_id, owner, items, settings):
+    """Legt einen Batch in die Warteschlange (idempotent pro Job-ID).
+
+    items sind (dateiname, daten)-Paare wie bei iter_batch; die Daten werden
+    in den Warteschlangen-Eintrag geschrieben, der Worker liest sie von dort.
+    Gespoolte Uploads (Pfade) werden nur verlinkt, nicht kopiert - der
+    Eintrag lebt so unabhängig von der Spool-TTL, bis der Job fertig ist.
+    Dasselbe gilt für ein Logo (settings["watermark_logo"]), dessen Pfad
+    im Auftrag auf den Eintrag umgeschrieben wird.
+    Eintrag erscheint erst vollständig (Verzeichnis wird atomar umbenannt).
+    """
+    job = load_job(job_id)
+    if job is not None and not job.get("partial"):
+        return
+    entry = _entry_path(job_id)
+    if os.path.isdir(entry):
+        status = _read_json(os.path.join(entry, STATUS_NAME))
+        if status is None or status["state"] != "failed":
+            return
+        shutil.rmtree(entry, ignore_errors=True)  # Fehlgeschlagenen Lauf neu einreihen
+
+    os.makedirs(QUEUE_DIR, exist_ok=True)
+    work_dir = tempfile.mkdtemp(prefix=f".{job_id}-", dir=QUEUE_DIR)
+    files = []
+    for idx, (filename, data) in enumerate(items):
+        name = f"{idx:05d}_{os.path.basename(filename)}"
+        target = os.path.join(work_dir, name)
+        if isinstance(data, os.PathLike):
+            _link_or_copy(data, target)
+        else:
+            with open(target, "wb") as f:
+                f.write(data if isinstance(data, bytes) else data.getvalue())
+        files.append({"filename": filename, "file": name})
+
+    if settings.get("watermark_logo"):
+        _link_or_copy(settings["watermark_logo"], os.path.join(work_dir, LOGO_NAME))
+        settings = {**settings, "watermark_logo": os.path.join(entry, LOGO_NAME)}
+
+    _write_json(os.path.join(work_dir, REQUEST_NAME), {
+        "job_id": job_id,
+        "owner": owner,
+        "plan": _plan(settings),
+        "settings": settings,
+        "items": files,
+        "submitted": time.time(),
+    })
+    try:
+        os.rename(work_dir, entry)
+    except OSError:
+        shutil.rmtree(work_dir, ignore_errors=True)  # parallel schon eingereicht
+
+
+def job_status(job_id):
+    """Status eines Jobs: state ist "queued", "running", "failed", "done", "partial" oder None.
+
+    Wartende Jobs liefern ahead (Jobs, die laut Scheduler vorher drankommen),
+    laufende zusätzlich done/total und live (fertige Bilder mit Thumbnail-
+    und Ausgabepfaden), fertige Jobs das Ergebnis als job.
+    """
+    entry = _entry_path(job_id)
+    if os.path.isdir(entry):
+        status = _read_json(os.path.join(entry, STATUS_NAME))
+        if status is None or status["state"] == "queued":
+            order = [request["job_id"] for request in FairScheduler().order(_queued_requests())]
+            ahead = order.index(job_id) if job_id in order else 0
+            return {"state": "queued", "done": 0, "total": 0, "live": [], "ahead": ahead}
+        for item in status.get("live", []):
+            item["thumbnail"] = os.path.join(entry, item["thumbnail"])
+            for output in item["outputs"]:
+                output["path"] = os.path.join(entry, output["path"])
+        return status
+
+    job = load_job(job_id)
+    if job is None:
+        return None
+    return {"state": "partial" if job.get("partial") else "done", "job": job}
+
+
+def cancel_job(job_id):
+    """Hält einen laufenden Job an - Fertiges bleibt als Teil-ZIP erhalten"""
+    entry = _entry_path(job_id)
+    if os.path.isdir(entry):
+        open(os.path.join(entry, CANCEL_NAME), "w").close()
+
+
+def worker_alive():
+    """True, wenn der Worker in den letzten WORKER_STALE_SECONDS ein Lebenszeichen gab"""
+    try:
+        return time.time() - os.path.getmtime(os.path.join(QUEUE_DIR, HEARTBEAT_NAME)) < WORKER_STALE_SECONDS
+    except OSError:
+        return False
+
+
+def queue_metrics():
+    """Warteschlangen-Kennzahlen pro Plan für das Admin-Panel.
+
+    queued/running: Anzahl Jobs, oldest_wait_seconds: längste aktuelle
+    Wartezeit, wait_p50/wait_p95: Wartezeit bis zum Start der letzten
+    WAIT_HISTORY_SIZE Jobs (None ohne Daten).
+    """
+    now = time.time()
+    metrics = {
+        plan: {"queued": 0, "running": 0, "oldest_wait_seconds": 0.0, "wait_p50": None, "wait_p95": None}
+        for plan in PLAN_LIMITS
+    }
+    for request in _queued_requests():
+        plan = metrics[request.get("plan", "free")]
+        plan["queued"] += 1
+        plan["oldest_wait_seconds"] = max(plan["oldest_wait_seconds"], now - request["submitted"])
+
+    history = _read_json(os.path.join(QUEUE_DIR, METRICS_NAME)) or {"waits": [], "running": {}}
+    for plan_name, plan in metrics.items():
+        waits = [wait for name, wait in history["waits"] if name == plan_name]
+        plan["running"] = history["running"].get(plan_name, 0)
+        plan["wait_p50"] = _percentile(waits, 0.5)
+        plan["wait_p95"] = _percentile(waits, 0.95)
+    return metrics
+
+
+def worker_cache_stats():
+    """Cache-Kennzahlen aus dem Worker-Prozess für das Admin-Panel.
+
+    Gerechnet (und gecacht) wird nur im Worker - die Zähler der Page
+    bewegen sich nicht. output: output_store.stats() des Workers seit
+    seinem Start, render: Treffer/Fehlschläge von Font-Registry (font) und
+    Kachel-Cache (tile), summiert über alle Pool-Prozesse (processes).
+    Stand des letzten Job-Starts bzw. -Endes (fehlt, solange der Worker
+    noch nichts gemeldet hat).
+    """
+    history = _read_json(os.path.join(QUEUE_DIR, METRICS_NAME)) or {}
+    return {"output": history.get("output_cache"), "render": history.get("render_cache")}
+
+
+def ensure_worker():
+    """Startet den Worker-Prozess, falls keiner läuft (doppelte Starts beenden sich selbst)"""
+    if worker_alive() or not WORKER_AUTOSTART:
+        return
+
+    # Abstürze (Tracebacks) landen im Log statt im Nichts
+    os.makedirs(QUEUE_DIR, exist_ok=True)
+    log_path = os.path.join(QUEUE_DIR, LOG_NAME)
+    try:
+        if os.path.getsize(log_path) > WORKER_LOG_MAX_BYTES:
+            os.replace(log_path, log_path + ".1")
+    except OSError:
+        pass
+
+    with open(log_path, "ab") as log:
+        subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__)],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stdin=subprocess.DEVNULL,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+            start_new_session=True
+        )
+
+# =============================================================================
+# WORKER-SEITE
+# =============================================================================
+
+class FairScheduler:
+    """Wählt den nächsten Job: PRO-Spur zuerst, innerhalb einer Spur fair pro Nutzer.
+
+    Pro Nutzer läuft höchstens ein Job gleichzeitig, weitere Jobs desselben
+    Nutzers warten. Unter den Nutzern einer Spur kommt zuerst dran, wer am
+    längsten nicht bedient wurde (Round Robin), danach der älteste Auftrag.
+    Pro Plan laufen höchstens PLAN_LIMITS[plan]["jobs"] Jobs. FREE-Jobs, die
+    länger als PRIORITY_MAX_WAIT_SECONDS warten, rücken in die PRO-Spur auf.
+    """
+
+    def __init__(self):
+        self.last_served = {}
+
+    def _key(self, request, now):
+        waited = now - request["submitted"]
+        priority = request.get("plan") == "pro" or waited > PRIORITY_MAX_WAIT_SECONDS
+        return (not priority, self.last_served.get(request["owner"], 0.0), request["submitted"])
+
+    def order(self, requests, now=None):
+        """Wartende Aufträge in der Reihenfolge, in der sie drankommen (ohne Grenzen)"""
+        now = now or time.time()
+        ordered = sorted(requests, key=lambda request: self._key(request, now))
+        # Pro Nutzer zählt nur sein ältester Auftrag in der Runde, der Rest reiht sich dahinter
+        first, rest, seen = [], [], set()
+        for request in ordered:
+            (rest if request["owner"] in seen else first).append(request)
+            seen.add(request["owner"])
+        return first + rest
+
+    def pick(self, requests, running, now=None):
+        """Nächster startbarer Auftrag unter Berücksichtigung der laufenden Jobs oder None"""
+        busy_owners = {request["owner"] for request in running}
+        running_per_plan = {plan: 0 for plan in PLAN_LIMITS}
+        for request in running:
+            running_per_plan[request.get("plan", "free")] += 1
+
+        for request in self.order(requests, now):
+            plan = request.get("plan", "free")
+            if request["owner"] in busy_owners or running_per_plan[plan] >= PLAN_LIMITS[plan]["jobs"]:
+                continue
+            self.last_served[request["owner"]] = now or time.time()
+            return request
+        return None
+
+
+def _purge_expired_entries(now=None):
+    """Entfernt abgebrochene oder fehlgeschlagene Einträge nach der Job-TTL"""
+    now = now or time.time()
+    for name in os.listdir(QUEUE_DIR):
+        entry = os.path.join(QUEUE_DIR, name)
+        try:
+            if os.path.isdir(entry) and now - os.path.getmtime(entry) > JOB_TTL_SECONDS:
+                shutil.rmtree(entry, ignore_errors=True)
+        except OSError:
+            continue
+
+
+def _purge_expired_data(idle):
+    """Alle TTL-gebundenen Daten aufräumen: Spool, fertige Jobs, Ausgabe-Cache.
+
+    Warteschlangen-Einträge nur, wenn gerade kein Job läuft.
+    """
+    for purge in (purge_expired_spools, purge_expired_jobs, output_store.purge_expired):
+        try:
+            purge()
+        except OSError:
+            continue
+    if idle:
+        _purge_expired_entries()
+
+
+def _requeue_interrupted():
+    """Aufträge eines abgestürzten Workers wieder einreihen (nur mit gehaltener Sperre aufrufen).
+
+    Die Zahl der Anläufe bleibt im Status stehen - ein Job, der schon
+    WORKER_MAX_ATTEMPTS Mal unterbrochen wurde, wird als fehlgeschlagen
+    markiert statt den Worker endlos erneut abstürzen zu lassen.
+    """
+    for name in os.listdir(QUEUE_DIR):
+        status_file = os.path.join(QUEUE_DIR, name, STATUS_NAME)
+        status = _read_json(status_file)
+        if status is None or status["state"] != "running":
+            continue
+        attempts = status.get("attempts", 1)
+        if attempts >= WORKER_MAX_ATTEMPTS:
+            _write_json(status_file, {
+                "state": "failed",
+                "error": f"Worker-Prozess ist {attempts}× während dieses Jobs abgestürzt",
+                "done": status["done"], "total": status["total"], "live": status["live"],
+            })
+        else:
+            _write_json(status_file, {"state": "queued", "attempts": attempts})
+
+
+def _record_metrics(running, started=None):
+    """Laufende Jobs pro Plan, Wartezeit eines gestarteten Jobs und Cache-Zähler ablegen.
+
+    Gelesen von queue_metrics und worker_cache_stats.
+    """
+    path = os.path.join(QUEUE_DIR, METRICS_NAME)
+    history = _read_json(path) or {"waits": [], "running": {}}
+    if started is not None:
+        wait = [started.get("plan", "free"), time.time() - started["submitted"]]
+        history["waits"] = (history["waits"] + [wait])[-WAIT_HISTORY_SIZE:]
+    history["running"] = {plan: sum(request.get("plan", "free") == plan for request in running) for plan in PLAN_LIMITS}
+    history["output_cache"] = output_store.stats()
+    with _render_caches_lock:
+        snapshots = list(_render_caches.values())
+    history["render_cache"] = {
+        cache: {counter: sum(snapshot[cache][counter] for snapshot in snapshots) for counter in ("hits", "misses")}
+        for cache in ("font", "tile")
+    }
+    history["render_cache"]["processes"] = len(snapshots)
+    _write_json(path, history)
+
+
+def process_request(request):
+    """Rechnet einen Auftrag über run_job und hält status.json aktuell.
+
+    Wie viele Bilder der Job gleichzeitig im Pool haben darf, bestimmt sein Plan.
+    """
+    entry = _entry_path(request["job_id"])
+    if os.path.exists(os.path.join(entry, CANCEL_NAME)):
+        shutil.rmtree(entry, ignore_errors=True)  # angehalten, bevor er dran war
+        return
+
+    # Eingaben liegen auf Platte und werden erst bei Bedarf gelesen
+    items = [(item["filename"], Path(entry, item["file"])) for item in request["items"]]
+    previous = _read_json(os.path.join(entry, STATUS_NAME)) or {}
+    status = {
+        "state": "running", "done": 0, "total": len(items), "live": [], "started": time.time(),
+        "attempts": previous.get("attempts", 0) + 1,
+    }
+    _write_json(os.path.join(entry, STATUS_NAME), status)
+
+    def on_result(done, total, idx, result):
+        status["done"] = done
+        if 'render_cache' in result:
+            with _render_caches_lock:
+                _render_caches[result['render_cache']['pid']] = result['render_cache']
+        if 'error' not in result and len(status["live"]) < LIVE_RESULTS_MAX:
+            live_dir = os.path.join(entry, "live", str(idx))
+            os.makedirs(live_dir, exist_ok=True)
+            with open(os.path.join(live_dir, "thumbnail"), "wb") as f:
+                f.write(result['thumbnail'])
+            outputs = []
+            for number, output in enumerate(result_outputs(result)):
+                with open(os.path.join(live_dir, str(number)), "wb") as f:
+                    f.write(output['data'])
+                outputs.append({"filename": output['filename'], "path": os.path.join("live", str(idx), str(number))})
+            status["live"].append({
+                "idx": idx,
+                "filename": result['filename'],
+                "thumbnail": os.path.join("live", str(idx), "thumbnail"),
+                "outputs": outputs,
+            })
+        _write_json(os.path.join(entry, STATUS_NAME), status)
+
+        if os.path.exists(os.path.join(entry, CANCEL_NAME)):
+            raise JobCancelled()
+
+    try:
+        run_job(
+            request["job_id"], items, request["settings"],
+            on_result=on_result,
+            max_in_flight=PLAN_LIMITS[request.get("plan", "free")]["in_flight"]
+        )
+    except JobCancelled:
+        pass
+    except Exception as e:
+        status.update(state="failed", error=str(e))
+        _write_json(os.path.join(entry, STATUS_NAME), status)
+        return
+
+    # Ergebnis liegt im Job-Store - Eingaben und Live-Dateien werden nicht mehr gebraucht
+    shutil.rmtree(entry, ignore_errors=True)
+
+
+def _touch_heartbeat():
+    path = os.path.join(QUEUE_DIR, HEARTBEAT_NAME)
+    with open(path, "a"):
+        os.utime(path)
+
+
+def _heartbeat(stop):
+    """Lebenszeichen auch während langer Bilder (eigener Thread)"""
+    while not stop.wait(HEARTBEAT_SECONDS):
+        _touch_heartbeat()
+
+
+def run_worker():
+    """Hauptschleife: genau ein Worker pro QUEUE_DIR (Dateisperre).
+
+    Bis zu WORKER_JOB_SLOTS Jobs laufen in eigenen Threads nebeneinander und
+    teilen sich den Prozess-Pool; welcher Job als Nächstes startet,
+    entscheidet der FairScheduler.
+    """
+    os.makedirs(QUEUE_DIR, exist_ok=True)
+    lock = open(os.path.join(QUEUE_DIR, LOCK_NAME), "w")
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        return  # läuft bereits
+
+    _requeue_interrupted()
+    _touch_heartbeat()
+    stop = threading.Event()
+    threading.Thread(target=_heartbeat, args=(stop,), daemon=True).start()
+
+    scheduler = FairScheduler()
+    running = {}
+    last_purge = 0
+    _record_metrics([])
+    try:
+        while True:
+            if time.time() - last_purge >= PURGE_INTERVAL_SECONDS:
+                _purge_expired_data(idle=not running)
+                last_purge = time.time()
+
+            finished = [job_id for job_id, (thread, _) in running.items() if not thread.is_alive()]
+            for job_id in finished:
+                del running[job_id]
+            if finished:
+                _record_metrics([request for _, request in running.values()])
+
+            request = None
+            if len(running) < WORKER_JOB_SLOTS:
+                waiting = [request for request in _queued_requests() if request["job_id"] not in running]
+                request = scheduler.pick(waiting, [request for _, request in running.values()])
+
+            if request is None:
+                time.sleep(POLL_SECONDS)
+                continue
+
+            thread = threading.Thread(target=process_request, args=(request,), daemon=True)
+            running[request["job_id"]] = (thread, request)
+            _record_metrics([request for _, request in running.values()], started=request)
+            thread.start()
+    finally:
+        stop.set()
+        lock.close()
+
+
+if __name__ == "__main__":
+    run_worker()
@@ -3,11 +3,39 @@ CreatorOS - Content Factory
 Bilder-Upload, Wasserzeichen, ZIP-Download
 """
 
+import time
 import streamlit as st
-from PIL import Image, ImageDraw, ImageFont, ImageOps
-import io
-import zipfile
+import pandas as pd
 from utils import check_auth, render_sidebar, init_session_state, inject_custom_css
+from image_pipeline import (
+    strip_metadata_lossless,
+    benchmark_profiles,
+    group_duplicates,
+    max_hash_distance,
+    DEFAULT_DUPLICATE_SIMILARITY,
+    OUTPUT_FORMATS,
+    ENCODER_PROFILES,
+    EXPORT_PRESETS,
+    DEFAULT_EXPORT_PRESET,
+    font_cache_stats,
+    get_watermark_tile,
+    admit_image,
+    LOGO_MAX_INPUT_PIXELS
+)
+from image_jobs import batch_id
+from image_worker import (
+    LIVE_RESULTS_MAX,
+    POLL_SECONDS,
+    cancel_job,
+    ensure_worker,
+    job_status,
+    queue_metrics,
+    submit_job,
+    worker_cache_stats
+)
+from image_batch import run_isolated, estimate_batch
+from image_cache import get_preview, get_thumbnail, get_perceptual_hash, get_probe, preview_cache
+from image_spool import map_file, purge_expired_spools, spool_upload
 
 # =============================================================================
 # PAGE CONFIG
@@ -29,63 +57,9 @@ init_session_state()
 user = check_auth()
 
 # =============================================================================
-# IMAGE PROCESSING FUNCTIONS
+# HELPER FUNCTIONS
 # =============================================================================
 
-def remove_metadata(image):
-    """Entfernt EXIF-Metadaten und korrigiert Rotation"""
-    image = ImageOps.exif_transpose(image)
-    data = list(image.getdata())
-    new_image = Image.new(image.mode, image.size)
-    new_image.putdata(data)
-    return new_image
-
-def add_watermark(image, text, opacity, padding, is_pro):
-    """Fügt Wasserzeichen hinzu"""
-    # Free-User: Erzwinge CreatorOS Branding
-    if not is_pro:
-        text = "Created with CreatorOS"
-    
-    base_image = image.convert("RGBA")
-    overlay = Image.new("RGBA", base_image.size, (255, 255, 255, 0))
-    draw = ImageDraw.Draw(overlay)
-    
-    # Font laden
-    font_size = int(image.height * 0.05)
-    font = None
-    font_paths = [
-        "arial.ttf",
-        "/System/Library/Fonts/Helvetica.ttc",
-        "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
-        "/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf",
-    ]
-    
-    for font_path in font_paths:
-        try:
-            font = ImageFont.truetype(font_path, font_size)
-            break
-        except:
-            continue
-    
-    if font is None:
-        font = ImageFont.load_default()
-    
-    text_color = (150, 150, 150, opacity)
-    bbox = draw.textbbox((0, 0), text, font=font)
-    text_width = bbox[2] - bbox[0]
-    text_height = bbox[3] - bbox[1]
-    
-    # Gekachelt (Tiled)
-    y_step = text_height + padding
-    x_step = text_width + padding
-    
-    for y in range(0, base_image.height + y_step, y_step):
-        for x in range(0, base_image.width + x_step, x_step):
-            draw.text((x, y), text, fill=text_color, font=font)
-    
-    final_image = Image.alpha_composite(base_image, overlay)
-    return final_image.convert("RGB")
-
 def format_bytes(size):
     """Formatiert Bytes in lesbare Größe"""
     if size < 1024:
@@ -95,6 +69,47 @@ def format_bytes(size):
     else:
         return f"{size / (1024 * 1024):.2f} MB"
 
+EXPORT_PRESET_LABELS = {
+    "original": "Originalgröße",
+    "feed": "📱 Feed (1080×1350)",
+    "story": "📲 Story/TikTok (1080×1920)",
+    "long_edge_2560": "🖥️ Lange Kante 2560 px",
+}
+
+ENCODER_PROFILE_LABELS = {
+    "fast": "⚡ Schnell",
+    "balanced": "⚖️ Ausgewogen",
+    "smallest": "🗜️ Klein",
+}
+
+def get_spooled_uploads(owner, files):
+    """Uploads einmal auf Platte spoolen (pro file_id) - danach nur noch per mmap gelesen"""
+    purge_expired_spools()
+    spooled = st.session_state.setdefault("upload_spool", {})
+    uploads = []
+    for file in files:
+        upload = spooled.get(file.file_id)
+        if upload is None or not upload.refresh():
+            upload = spooled[file.file_id] = spool_upload(owner, file)
+        uploads.append(upload)
+    return uploads
+
+def admit_files(files, settings):
+    """Prüft Uploads nur anhand der Header - vor jeder Dekodierung.
+
+    Gibt (zugelassene_dateien, zulassungen, abgelehnte) zurück; abgelehnte
+    sind (datei, zulassung)-Paare.
+    """
+    admitted, admissions, rejected = [], [], []
+    for file in files:
+        admission = admit_image(get_probe(file.digest, file), settings)
+        if admission['action'] == "reject":
+            rejected.append((file, admission))
+        else:
+            admitted.append(file)
+            admissions.append(admission)
+    return admitted, admissions, rejected
+
 # =============================================================================
 # SIDEBAR WITH SETTINGS
 # =============================================================================
@@ -120,6 +135,27 @@ else:
         key="watermark_text"
     )
 
+logo_file = st.sidebar.file_uploader(
+    "Logo (statt Text)",
+    type=["png", "webp"],
+    key="watermark_logo_upload",
+    disabled=not is_pro and not is_admin,
+    help="PNG/WebP mit Transparenz - wird wie der Text gekachelt" if (is_pro or is_admin) else "🔒 PRO Feature"
+)
+
+# Logo wie Uploads auf Platte - die Pipeline dekodiert es einmal pro Prozess
+watermark_logo = None
+if logo_file is not None and (is_pro or is_admin):
+    logo = get_spooled_uploads(user_email, [logo_file])[0]
+    logo_probe = get_probe(logo.digest, logo)
+    if 'error' in logo_probe:
+        st.sidebar.error("🚫 Logo ist kein lesbares Bild")
+    elif logo_probe['pixels'] > LOGO_MAX_INPUT_PIXELS:
+        st.sidebar.error(f"🚫 Logo zu groß (max. {LOGO_MAX_INPUT_PIXELS / 1_000_000:.0f} MP)")
+    else:
+        watermark_logo = logo.path
+        st.sidebar.caption("🖼️ Logo ersetzt den Text")
+
 opacity = st.sidebar.slider(
     "Deckkraft",
     0, 255,
@@ -141,14 +177,14 @@ st.sidebar.subheader("📤 Export")
 
 output_format = st.sidebar.selectbox(
     "Format",
-    ["PNG", "JPEG"],
-    index=0 if st.session_state["output_format"] == "PNG" else 1,
+    OUTPUT_FORMATS,
+    index=OUTPUT_FORMATS.index(st.session_state["output_format"]) if st.session_state["output_format"] in OUTPUT_FORMATS else 0,
     key="output_format"
 )
 
-if output_format == "JPEG":
+if output_format != "PNG":
     jpeg_quality = st.sidebar.slider(
-        "JPEG Qualität",
+        "Qualität",
         1, 100,
         st.session_state["jpeg_quality"],
         key="jpeg_quality"
@@ -156,6 +192,93 @@ if output_format == "JPEG":
 else:
     jpeg_quality = 85
 
+export_presets = st.sidebar.multiselect(
+    "Größen",
+    list(EXPORT_PRESETS),
+    default=st.session_state["export_presets"],
+    format_func=lambda preset: EXPORT_PRESET_LABELS[preset],
+    key="export_presets",
+    help="Verkleinert direkt nach dem Dekodieren - Wasserzeichen und Encoding laufen nur auf den Zielpixeln (gilt nicht für Nur-EXIF). "
+         "Mehrere Größen: jedes Bild wird nur einmal dekodiert, das ZIP enthält einen Ordner pro Größe."
+) or [DEFAULT_EXPORT_PRESET]
+export_preset = export_presets[0]
+
+if len(export_presets) > 1:
+    st.sidebar.caption(f"Vorschau: {EXPORT_PRESET_LABELS[export_preset]}")
+
+encoder_profile = st.sidebar.selectbox(
+    "Encoder-Profil",
+    list(ENCODER_PROFILES),
+    index=list(ENCODER_PROFILES).index(st.session_state["encoder_profile"]),
+    format_func=lambda profile: ENCODER_PROFILE_LABELS[profile],
+    key="encoder_profile",
+    help="Schnell = wenig CPU, größere Dateien | Klein = mehr CPU, kleinere Dateien"
+)
+
+# Verlustfreier Scrub ohne Wasserzeichen (PRO, da FREE immer Branding bekommt)
+strip_only = st.sidebar.checkbox(
+    "🧹 Nur Metadaten entfernen (verlustfrei)",
+    value=False,
+    disabled=not is_pro and not is_admin,
+    help="JPEG/PNG werden ohne Neukodierung bereinigt - kein Wasserzeichen, kein Qualitätsverlust" if (is_pro or is_admin) else "🔒 PRO Feature"
+)
+strip_only = strip_only and (is_pro or is_admin)
+
+# Admin: Cache-Statistiken der Render-Pipeline
+if is_admin:
+    with st.sidebar.expander("🔧 Render-Caches"):
+        font_stats = font_cache_stats()
+        st.caption(f"Schrift: {font_stats['font_path'] or 'Default'}")
+        # Die Page rendert nur Vorschauen - ihre Zähler sind die der Vorschau
+        st.caption(f"Font-Registry (Vorschau): {font_stats['hits']} Treffer / {font_stats['misses']} Fehlschläge ({font_stats['cached']}/{font_stats['max_cached']} geladen)")
+        tile_stats = get_watermark_tile.cache_info()
+        st.caption(f"Wasserzeichen-Kacheln (Vorschau): {tile_stats.hits} Treffer / {tile_stats.misses} Fehlschläge")
+        preview_stats = preview_cache.stats()
+        st.caption(f"Vorschau-Cache: {preview_stats['hits']} Treffer / {preview_stats['misses']} Fehlschläge ({format_bytes(preview_stats['bytes'])} von {format_bytes(preview_stats['max_bytes'])})")
+        # Batches rechnet der Image-Worker bzw. sein Pool - seine Zähler, nicht die der Page
+        worker_stats = worker_cache_stats()
+        render_stats = worker_stats['render']
+        if not render_stats or not render_stats['processes']:
+            st.caption("Font-Registry/Kacheln (Worker): noch keine Daten vom Image-Worker")
+        else:
+            st.caption(
+                f"Font-Registry (Worker, {render_stats['processes']} Prozesse): {render_stats['font']['hits']} Treffer / {render_stats['font']['misses']} Fehlschläge | "
+                f"Kacheln: {render_stats['tile']['hits']} Treffer / {render_stats['tile']['misses']} Fehlschläge"
+            )
+        output_stats = worker_stats['output']
+        if output_stats is None:
+            st.caption("Ausgabe-Cache: noch keine Daten vom Image-Worker")
+        else:
+            st.caption(f"Ausgabe-Cache (Worker): {output_stats['hit_rate']:.0%} Trefferquote ({output_stats['hits']} / {output_stats['hits'] + output_stats['misses']}) | {output_stats['entries']} Bilder, {format_bytes(output_stats['bytes'])} von {format_bytes(output_stats['max_bytes'])}")
+    
+    with st.sidebar.expander("🏭 Image-Worker"):
+        for plan, metrics in queue_metrics().items():
+            wait_text = (
+                f"Wartezeit p50 {metrics['wait_p50']:.1f} s / p95 {metrics['wait_p95']:.1f} s"
+                if metrics['wait_p50'] is not None else "noch keine Wartezeiten"
+            )
+            st.caption(
+                f"{plan.upper()}: {metrics['queued']} wartend (älteste {metrics['oldest_wait_seconds']:.0f} s), "
+                f"{metrics['running']} laufend | {wait_text}"
+            )
+
+# Einstellungen wie in user_settings - für Vorschau und Worker
+settings = {
+    "watermark_text": st.session_state["watermark_text"] if (is_pro or is_admin) else "Created with CreatorOS",
+    "opacity": st.session_state["opacity"],
+    "padding": st.session_state["padding"],
+    "output_format": output_format,
+    "jpeg_quality": jpeg_quality,
+    "is_pro": is_pro or is_admin,
+    "strip_only": strip_only,
+    "encoder_profile": encoder_profile,
+    "export_preset": export_preset
+}
+if len(export_presets) > 1:
+    settings["export_presets"] = export_presets
+if watermark_logo:
+    settings["watermark_logo"] = watermark_logo
+
 # =============================================================================
 # MAIN AREA
 # =============================================================================
@@ -189,46 +312,73 @@ with col_left:
         # Free-User: Nur 1 Bild
         if not is_pro and not is_admin and len(uploaded_files) > 1:
             st.info(f"📋 {len(uploaded_files)} hochgeladen, aber nur 1 wird verarbeitet (FREE)")
-            files_to_process = uploaded_files[:1]
-        else:
-            files_to_process = uploaded_files
+            uploaded_files = uploaded_files[:1]
+        
+        # Ab hier nur noch Dateien auf Platte - Vorschau, Hashes und Worker lesen per mmap
+        files_to_process = get_spooled_uploads(user_email, uploaded_files)
         
-        st.success(f"✅ {len(files_to_process)} Bild(er)")
+        # Zu große oder unlesbare Dateien fliegen raus, bevor irgendetwas dekodiert wird
+        files_to_process, admissions, rejected = admit_files(files_to_process, settings)
+        for file, admission in rejected:
+            st.error(f"🚫 {file.name}: {admission['reason']}")
+        for file, admission in zip(files_to_process, admissions):
+            if admission['action'] == "downscale":
+                st.caption(f"📐 {file.name}: wird vorab verkleinert ({admission['reason']})")
         
+        if files_to_process:
+            st.success(f"✅ {len(files_to_process)} Bild(er)")
+    
+    if uploaded_files and files_to_process:
         # Live-Vorschau
         st.divider()
         st.subheader("👁️ Vorschau")
         
         first_file = files_to_process[0]
-        preview_img = Image.open(first_file)
-        first_file.seek(0)
-        
-        cleaned = remove_metadata(preview_img)
-        watermarked = add_watermark(
-            cleaned,
-            st.session_state["watermark_text"] if (is_pro or is_admin) else "Created with CreatorOS",
-            st.session_state["opacity"],
-            st.session_state["padding"],
-            is_pro or is_admin
-        )
+        first_digest = first_file.digest
         
-        tab1, tab2 = st.tabs(["Original", "Wasserzeichen"])
+        # Original nur als Thumbnail an den Browser schicken
+        original_thumb = get_thumbnail(first_digest, first_file)
         
-        with tab1:
-            st.image(preview_img, use_container_width=True)
-        
-        with tab2:
-            st.image(watermarked, use_container_width=True)
+        if strip_only:
+            # Direkt aus dem gemappten Spool - kein Kopieren des Uploads auf den Heap
+            with map_file(first_file) as data:
+                try:
+                    stripped_size = len(strip_metadata_lossless(data)[0])
+                except ValueError:
+                    stripped_size = None  # z.B. abgeschnittenes JPEG oder WebP mit .png-Endung
             
-            # Dateigröße
-            buf = io.BytesIO()
-            if output_format == "PNG":
-                watermarked.save(buf, format="PNG")
-            else:
-                watermarked.save(buf, format="JPEG", quality=jpeg_quality, optimize=True)
+            tab1, tab2 = st.tabs(["Original", "Bereinigt"])
             
-            st.caption(f"📊 Größe: {format_bytes(len(buf.getvalue()))}")
-    else:
+            with tab1:
+                st.image(original_thumb, use_container_width=True)
+            
+            with tab2:
+                # Pixel sind identisch zum Original - gleiches Thumbnail
+                st.image(original_thumb, use_container_width=True)
+                if stripped_size is None:
+                    st.caption("⚠️ Nicht verlustfrei bereinigbar - wird beim Verarbeiten dekodiert und ohne Metadaten neu kodiert")
+                else:
+                    st.caption(f"📊 Größe: {format_bytes(stripped_size)} (vorher {format_bytes(first_file.size)})")
+        else:
+            # Prozessweit gecacht: bekannte Einstellungen kosten nichts,
+            # neue rendern nur den (ebenfalls gecachten) Proxy neu
+            watermarked, estimated_size, output_size = get_preview(
+                first_digest,
+                first_file,
+                settings
+            )
+            
+            tab1, tab2 = st.tabs(["Original", "Wasserzeichen"])
+            
+            with tab1:
+                st.image(original_thumb, use_container_width=True)
+            
+            with tab2:
+                st.image(watermarked, use_container_width=True)
+                
+                # Dateigröße (aus dem Proxy-Encode hochgerechnet)
+                st.caption(f"📊 Größe: ~{format_bytes(estimated_size)} (geschätzt, {output_size[0]}×{output_size[1]} px)")
+    elif not uploaded_files:
         st.info("👆 Bilder hochladen")
 
 # =============================================================================
@@ -238,90 +388,209 @@ with col_left:
 with col_right:
     st.subheader("🚀 Verarbeitung")
     
-    if uploaded_files:
-        # Free-User: Nur 1 Bild
-        if not is_pro and not is_admin and len(uploaded_files) > 1:
-            files_to_process = uploaded_files[:1]
-        else:
-            files_to_process = uploaded_files
-        
+    if uploaded_files and files_to_process:
         if len(files_to_process) > 1:
             st.info(f"📋 {len(files_to_process)} Bilder bereit")
         
-        if st.button("🚀 Verarbeiten & ZIP Download", type="primary", use_container_width=True):
-            progress = st.progress(0)
-            status = st.empty()
-            
-            processed = []
+        # Serienbilder: nur ein Bild pro Gruppe ähnlicher Bilder verarbeiten
+        skipped_duplicates = 0
+        if len(files_to_process) > 1:
+            dedupe = st.checkbox(
+                "🔁 Ähnliche Bilder erkennen",
+                value=False,
+                key="dedupe",
+                help="Erkennt fast identische Bilder (z.B. Serienaufnahmen) per Perceptual Hash"
+            )
             
-            for idx, file in enumerate(files_to_process):
-                status.text(f"⏳ {idx+1}/{len(files_to_process)}: {file.name}")
-                
-                img = Image.open(file)
-                cleaned = remove_metadata(img)
-                final = add_watermark(
-                    cleaned,
-                    st.session_state["watermark_text"] if (is_pro or is_admin) else "Created with CreatorOS",
-                    st.session_state["opacity"],
-                    st.session_state["padding"],
-                    is_pro or is_admin
+            if dedupe:
+                similarity = st.slider(
+                    "Ähnlichkeit (%)",
+                    70, 100,
+                    int(DEFAULT_DUPLICATE_SIMILARITY * 100),
+                    key="dedupe_similarity"
                 )
                 
-                processed.append({
-                    'image': final,
-                    'filename': file.name
-                })
+                hashes = [get_perceptual_hash(file.digest, file) for file in files_to_process]
+                groups = group_duplicates(hashes, max_hash_distance(similarity / 100))
+                duplicate_groups = [group for group in groups if len(group) > 1]
                 
-                progress.progress((idx + 1) / len(files_to_process))
-                file.seek(0)
+                if duplicate_groups:
+                    keep = st.radio(
+                        f"{len(duplicate_groups)} Gruppe(n) mit {sum(len(group) for group in duplicate_groups)} ähnlichen Bildern",
+                        ["Nur ein Bild pro Gruppe", "Alle verarbeiten"],
+                        key="dedupe_keep"
+                    )
+                    
+                    with st.expander("🔍 Gruppen anzeigen"):
+                        for group in duplicate_groups:
+                            st.caption(" | ".join(files_to_process[idx].name for idx in group))
+                    
+                    if keep == "Nur ein Bild pro Gruppe":
+                        # Größte Datei als Repräsentant (meist das schärfste Bild der Serie)
+                        representatives = sorted(
+                            max(group, key=lambda idx: files_to_process[idx].size)
+                            for group in groups
+                        )
+                        skipped_duplicates = len(files_to_process) - len(representatives)
+                        files_to_process = [files_to_process[idx] for idx in representatives]
+                else:
+                    st.caption("Keine ähnlichen Bilder gefunden")
+        
+        # Kosten aus den Headern abschätzen (nichts ist bisher dekodiert)
+        _, admissions, _ = admit_files(files_to_process, settings)
+        estimate = estimate_batch(admissions)
+        large_count = sum(admission['action'] != "ok" for admission in admissions)
+        estimate_text = (
+            f"🧮 Geschätzt: ~{estimate['wall_seconds']:.0f} s ({estimate['cpu_seconds']:.0f} s CPU) | "
+            f"RAM-Spitze ~{format_bytes(estimate['peak_memory_bytes'])}"
+        )
+        if large_count:
+            estimate_text += f" | {large_count} große(s) Bild(er) im Band-Modus"
+        st.caption(estimate_text)
+        
+        # Stabile Batch-ID: ein fertiger Batch wird nach jedem Rerun
+        # (z.B. durch den Download-Button) wiedergefunden statt neu berechnet
+        job_id = batch_id(
+            user_email,
+            [file.digest for file in files_to_process],
+            settings
+        )
+        # Gerechnet wird im Image-Worker-Prozess - die Page reicht nur ein
+        # und fragt den Status ab, andere Sessions bleiben flüssig
+        job_state = job_status(job_id)
+        state = job_state['state'] if job_state else None
+        job = job_state.get('job') if job_state else None
+        partial = state == "partial"
+        
+        if state == "failed":
+            st.error(f"❌ Verarbeitung fehlgeschlagen: {job_state.get('error', 'unbekannter Fehler')}")
+        
+        start_label = "▶️ Fortsetzen" if partial else "🚀 Verarbeiten & ZIP Download"
+        if state in (None, "partial", "failed") and st.button(start_label, type="primary", use_container_width=True):
+            submit_job(job_id, user_email, [(file.name, file) for file in files_to_process], settings)
+            job_state = job_status(job_id)
+            state = job_state['state'] if job_state else None
+        
+        if state in ("queued", "running"):
+            if st.button("⏸️ Anhalten & Teil-ZIP", use_container_width=True):
+                cancel_job(job_id)
             
-            status.empty()
-            progress.empty()
+            progress = st.progress(0)
+            status = st.empty()
+            live = st.container()
+            shown = 0
             
-            st.success(f"🎉 {len(processed)} Bild(er) verarbeitet!")
+            while job_state is not None and job_state['state'] in ("queued", "running"):
+                # Bei jeder Abfrage: stirbt der Worker mitten im Job, startet
+                # ein neuer und reiht den Auftrag wieder ein
+                ensure_worker()
+                if job_state['state'] == "running":
+                    progress.progress(job_state['done'] / job_state['total'])
+                    status.text(f"⏳ {job_state['done']}/{job_state['total']}")
+                else:
+                    status.text(f"⏳ In der Warteschlange ({job_state.get('ahead', 0)} Job(s) vor dir)...")
+                
+                # Ergebnisse sofort zeigen - nicht erst, wenn das ZIP fertig ist
+                for item in job_state.get('live', [])[shown:]:
+                    try:
+                        with live:
+                            col_thumb, col_download = st.columns([1, 2])
+                            col_thumb.image(item['thumbnail'], use_container_width=True)
+                            for output in item['outputs']:
+                                with open(output['path'], "rb") as f:
+                                    col_download.download_button(
+                                        f"⬇️ {output['filename']}",
+                                        f.read(),
+                                        output['filename'].rsplit("/", 1)[-1],
+                                        key=f"live_{item['idx']}_{output['filename']}",
+                                        on_click="ignore",
+                                        use_container_width=True
+                                    )
+                    except OSError:
+                        break  # Job gerade fertig geworden - das ZIP folgt
+                    shown += 1
+                    if shown == LIVE_RESULTS_MAX and job_state['total'] > LIVE_RESULTS_MAX:
+                        live.caption("Weitere Bilder landen im ZIP")
+                
+                time.sleep(POLL_SECONDS)
+                job_state = job_status(job_id)
             
-            # ZIP erstellen
-            zip_buf = io.BytesIO()
-            ext = "png" if output_format == "PNG" else "jpg"
+            # Fertig, angehalten oder fehlgeschlagen - Ergebnis frisch rendern
+            st.rerun()
+        
+        if job is not None:
+            for item in job['errors']:
+                st.warning(f"⚠️ {item['filename']}: {item['error']}")
             
-            with zipfile.ZipFile(zip_buf, 'w', zipfile.ZIP_DEFLATED) as zf:
-                for idx, item in enumerate(processed):
-                    img_buf = io.BytesIO()
-                    
-                    if output_format == "PNG":
-                        item['image'].save(img_buf, format="PNG")
-                    else:
-                        item['image'].save(img_buf, format="JPEG", quality=jpeg_quality, optimize=True)
-                    
-                    name = item['filename'].rsplit('.', 1)[0]
-                    zf.writestr(f"{name}.{ext}", img_buf.getvalue())
+            if partial:
+                st.warning(f"⏸️ Angehalten: {job['count']} von {job['total']} Bild(ern) im Teil-ZIP")
+            else:
+                st.success(f"🎉 {job['count']} Bild(er) verarbeitet!")
             
-            zip_buf.seek(0)
+            st.info(f"📦 ZIP: {format_bytes(job['archive_size'])}")
             
-            st.info(f"📦 ZIP: {format_bytes(len(zip_buf.getvalue()))}")
+            if skipped_duplicates and job['count']:
+                # Hochrechnung aus den tatsächlich gerechneten Bildern dieses Batches
+                computed = job['count'] - job.get('cached', 0)
+                per_image_seconds = job.get('process_seconds', 0.0) / computed if computed else 0.0
+                per_image_bytes = job['output_bytes'] / job['count'] if job.get('output_bytes') else job['archive_size'] / job['count']
+                st.caption(
+                    f"🔁 {skipped_duplicates} Duplikat(e) übersprungen: ca. {per_image_seconds * skipped_duplicates:.1f} s CPU "
+                    f"und {format_bytes(per_image_bytes * skipped_duplicates)} ZIP gespart"
+                )
+            if job.get('cached'):
+                st.caption(f"♻️ {job['cached']} von {job['count']} Bildern aus dem Ausgabe-Cache")
+            if job.get('encode_seconds'):
+                st.caption(f"⏱️ Encoding ({ENCODER_PROFILE_LABELS[encoder_profile]}): {job['encode_seconds']:.2f} s CPU für {format_bytes(job['output_bytes'])}")
             
-            st.download_button(
-                "⬇️ ZIP herunterladen",
-                zip_buf,
-                "creatorOS_processed.zip",
-                "application/zip",
-                use_container_width=True
-            )
+            with open(job['archive_path'], "rb") as archive:
+                st.download_button(
+                    "⬇️ Teil-ZIP herunterladen" if partial else "⬇️ ZIP herunterladen",
+                    archive.read(),
+                    "creatorOS_processed_partial.zip" if partial else "creatorOS_processed.zip",
+                    "application/zip",
+                    use_container_width=True
+                )
             
             # Vorschau
             st.divider()
             st.subheader("🖼️ Galerie")
             
-            for i in range(0, min(len(processed), 4), 2):
+            processed = job['gallery']
+            
+            for i in range(0, len(processed), 2):
                 cols = st.columns(2)
                 for j in range(2):
                     if i + j < len(processed):
                         with cols[j]:
                             st.image(
-                                processed[i + j]['image'],
+                                processed[i + j]['path'],
                                 caption=processed[i + j]['filename'],
                                 use_container_width=True
                             )
+        
+        # Encoder-Profile am ersten Bild des Batches messen
+        if not strip_only:
+            with st.expander("📏 Encoder-Profile vergleichen"):
+                st.caption("Misst alle Profile am ersten Bild und rechnet auf den Batch hoch.")
+                if st.button("Messen", use_container_width=True):
+                    with st.spinner("Messe..."):
+                        measurements = run_isolated(benchmark_profiles, files_to_process[0].read_bytes(), settings)
+                    
+                    count = len(files_to_process)
+                    st.dataframe(
+                        pd.DataFrame([
+                            {
+                                "Profil": ENCODER_PROFILE_LABELS[m["profile"]],
+                                "Zeit/Bild": f"{m['seconds']:.2f} s",
+                                "Größe/Bild": format_bytes(m["bytes"]),
+                                "Batch (≈)": f"{m['seconds'] * count:.1f} s | {format_bytes(m['bytes'] * count)}",
+                            }
+                            for m in measurements
+                        ]),
+                        use_container_width=True,
+                        hide_index=True
+                    )
     else:
         st.info("Warte auf Upload...")
 
@@ -63,6 +63,7 @@ with col_profile1:
         st.write("Du hast Zugriff auf alle Features:")
         st.write("✅ Unbegrenzte Batch-Verarbeitung")
         st.write("✅ Custom Wasserzeichen-Text")
+        st.write("✅ Logo als Wasserzeichen")
         st.write("✅ Alle CRM & Finance Features")
         st.write("✅ Unbegrenzte Tasks")
     else:
@@ -93,7 +94,7 @@ if not is_pro and not is_admin:
         st.write("**PRO Vorteile:**")
         st.write("✨ Unbegrenzte Batch-Verarbeitung")
         st.write("✨ Custom Wasserzeichen-Text")
-        st.write("✨ Logo-Upload (Coming Soon)")
+        st.write("✨ Logo als Wasserzeichen")
         st.write("✨ Prioritäts-Support")
         st.write("✨ Keine Limitierungen")
     
@@ -299,10 +300,11 @@ with st.expander("🔒 Datenschutzerklärung"):
     **4. Bildverarbeitung**
 
     Hochgeladene Bilder werden:
-    - Nur temporär im RAM verarbeitet
+    - Nur temporär verarbeitet
     - Niemals dauerhaft gespeichert
     - Niemals an Dritte weitergegeben
-    - Sofort nach der Verarbeitung gelöscht
+    - Als Original für die Verarbeitung bis maximal 60 Minuten nach der letzten Nutzung zwischengespeichert und danach automatisch gelöscht
+    - Fertig verarbeitet für den Download maximal 60 Minuten zwischengespeichert und danach automatisch gelöscht
 
     **5. Cookies und Tracking**
 
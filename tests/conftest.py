@@ -0,0 +1,9 @@
+"""
+CreatorOS - Tests
+Die Module liegen flach im Repo-Wurzelverzeichnis
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,49 @@
+"""
+CreatorOS - Tests des Job-Stores
+Aufräumen abgelaufener Jobs darf laufende Batches nicht treffen
+"""
+
+import io
+import time
+
+from PIL import Image
+
+import image_batch
+import image_jobs
+from image_store import OutputStore
+
+SETTINGS = {
+    "watermark_text": "© Test",
+    "opacity": 180,
+    "padding": 20,
+    "output_format": "JPEG",
+    "jpeg_quality": 85,
+    "is_pro": True,
+}
+
+
+def _items(count):
+    items = []
+    for idx in range(count):
+        out = io.BytesIO()
+        Image.new("RGB", (64, 48), (idx * 40, 0, 0)).save(out, "JPEG")
+        items.append((f"{idx}.jpg", out.getvalue()))
+    return items
+
+
+def test_purge_keeps_running_job_longer_than_ttl(tmp_path, monkeypatch):
+    monkeypatch.setattr(image_jobs, "JOB_DIR", str(tmp_path / "jobs"))
+    monkeypatch.setattr(image_jobs, "JOB_TTL_SECONDS", 1)
+    monkeypatch.setattr(image_jobs, "GALLERY_SIZE", 1)  # späte Bilder schreiben keine Datei mehr
+    monkeypatch.setattr(image_batch, "output_store", OutputStore(str(tmp_path / "outputs"), 10**8, 3600))
+
+    def slow_with_purge(done, total, idx, result):
+        # Der ganze Batch dauert länger als die TTL, jedes Bild kürzer
+        time.sleep(0.4)
+        image_jobs.purge_expired_jobs()
+
+    job = image_jobs.run_job("long", _items(6), SETTINGS, workers=1, on_result=slow_with_purge)
+
+    assert job is not None
+    assert job["count"] == 6
+    assert not job["partial"]
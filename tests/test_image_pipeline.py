@@ -0,0 +1,170 @@
+"""
+CreatorOS - Tests der Bild-Pipeline
+Speicher- und Zeit-Regressionstest für remove_metadata an einem großen
+synthetischen Bild (24 MP), Header-Probe ohne Dekodieren, 16-Bit-Eingaben
+"""
+
+import io
+import time
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from image_pipeline import (
+    EXIF_ORIENTATION, make_thumbnail, perceptual_hash, probe_image, process_image, remove_metadata
+)
+
+# =============================================================================
+# HILFSFUNKTIONEN
+# =============================================================================
+
+# 6000 x 4000 RGB = 24 MP, eine Kopie der Pixel sind 72 MB
+LARGE_SIZE = (6000, 4000)
+PIXEL_BYTES = LARGE_SIZE[0] * LARGE_SIZE[1] * 3
+
+# Pro-Pixel-Python-Objekte (list(getdata())) bräuchten Gigabytes und Sekunden
+MAX_SECONDS = 5.0
+
+
+def _status_kb(field):
+    with open("/proc/self/status", "r", encoding="ascii") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    return None
+
+
+def _reset_peak_rss():
+    """Setzt VmHWM auf den aktuellen RSS zurück (nur Linux)"""
+    try:
+        with open("/proc/self/clear_refs", "w", encoding="ascii") as f:
+            f.write("5")
+    except OSError:
+        pytest.skip("Spitzen-RSS lässt sich nur unter Linux zurücksetzen")
+
+
+def _peak_growth_bytes(fn):
+    """Führt fn aus und gibt (ergebnis, RSS-Zuwachs an der Spitze in Bytes, Sekunden) zurück"""
+    _reset_peak_rss()
+    before = _status_kb("VmRSS")
+    start = time.perf_counter()
+    result = fn()
+    seconds = time.perf_counter() - start
+    return result, (_status_kb("VmHWM") - before) * 1024, seconds
+
+
+def _large_image(orientation=1):
+    image = Image.new("RGB", LARGE_SIZE, (40, 80, 120))
+    image.getexif()[EXIF_ORIENTATION] = orientation
+    image.info["exif"] = image.getexif().tobytes()
+    image.info["icc_profile"] = b"\0" * 128
+    return image
+
+# =============================================================================
+# TESTS
+# =============================================================================
+
+def test_remove_metadata_large_image_stays_near_one_copy():
+    image = _large_image()
+    clean, growth, seconds = _peak_growth_bytes(lambda: remove_metadata(image))
+
+    assert clean.size == LARGE_SIZE
+    assert clean.info == {}
+    assert growth < 1.5 * PIXEL_BYTES
+    assert seconds < MAX_SECONDS
+
+
+def test_remove_metadata_in_place_needs_no_copy():
+    image = _large_image()
+    clean, growth, seconds = _peak_growth_bytes(lambda: remove_metadata(image, in_place=True))
+
+    assert clean is image
+    assert growth < 0.5 * PIXEL_BYTES
+    assert seconds < MAX_SECONDS
+
+
+def test_remove_metadata_applies_orientation_with_one_copy():
+    image = _large_image(orientation=6)
+    clean, growth, seconds = _peak_growth_bytes(lambda: remove_metadata(image))
+
+    assert clean.size == (LARGE_SIZE[1], LARGE_SIZE[0])
+    assert EXIF_ORIENTATION not in clean.getexif()
+    assert "exif" not in clean.info
+    assert growth < 1.5 * PIXEL_BYTES
+    assert seconds < MAX_SECONDS
+
+# =============================================================================
+# PROBE
+# =============================================================================
+
+def _png(exif=None):
+    out = io.BytesIO()
+    Image.new("RGB", (300, 200), "white").save(out, "PNG", **({"exif": exif} if exif else {}))
+    out.seek(0)
+    return out
+
+
+def _opened_images(monkeypatch):
+    """Sammelt alle Bilder, die Image.open zurückgibt"""
+    opened = []
+    image_open = Image.open
+
+    def recording_open(*args, **kwargs):
+        opened.append(image_open(*args, **kwargs))
+        return opened[-1]
+
+    monkeypatch.setattr(Image, "open", recording_open)
+    return opened
+
+
+def test_probe_png_without_exif_does_not_decode(monkeypatch):
+    opened = _opened_images(monkeypatch)
+
+    probe = probe_image(_png())
+
+    assert probe["orientation"] == 1
+    assert probe["oriented_size"] == (300, 200)
+    assert len(opened) == 1
+    assert opened[0]._im is None  # nie dekodiert
+
+
+def test_probe_png_reads_orientation_before_idat_without_decoding(monkeypatch):
+    exif = Image.Exif()
+    exif[EXIF_ORIENTATION] = 6
+    opened = _opened_images(monkeypatch)
+
+    probe = probe_image(_png(exif))
+
+    assert probe["orientation"] == 6
+    assert probe["oriented_size"] == (200, 300)
+    assert len(opened) == 1
+    assert opened[0]._im is None  # nie dekodiert
+
+
+def _png16(size=(4000, 3000)):
+    """16-Bit-Graustufen-PNG (I;16) mit horizontalem Verlauf über den vollen Wertebereich"""
+    gradient = np.linspace(0, 65535, size[0]).astype(np.uint16)
+    out = io.BytesIO()
+    Image.fromarray(np.tile(gradient, (size[1], 1))).save(out, "PNG")
+    return out.getvalue()
+
+
+def test_16bit_png_thumbnail_hash_and_output_keep_gradient():
+    data = _png16()
+    assert Image.open(io.BytesIO(data)).mode == "I;16"
+
+    thumb = Image.open(io.BytesIO(make_thumbnail(io.BytesIO(data)))).convert("L")
+    assert thumb.size == (480, 360)
+    assert abs(thumb.getpixel((240, 180)) - 128) < 8  # Mitte grau, nicht bei 255 abgeschnitten
+
+    # Verlauf nach rechts: jeder Nachbarvergleich heller (abgeschnitten wäre alles gleich)
+    assert perceptual_hash(io.BytesIO(data)) == (1 << 64) - 1
+
+    result = process_image(data, {
+        "watermark_text": "© Test", "opacity": 180, "padding": 20,
+        "output_format": "JPEG", "jpeg_quality": 85, "is_pro": True,
+    })
+    output = Image.open(io.BytesIO(result["data"])).convert("L")
+    assert output.size == (4000, 3000)
+    assert output.getpixel((10, 10)) < 32 and output.getpixel((3990, 10)) > 224
@@ -0,0 +1,82 @@
+"""
+CreatorOS - Tests des Image-Workers
+Ein Job, der den Worker abstürzen lässt, darf nicht endlos neu starten;
+Cache-Zähler der Pool-Prozesse landen in den Worker-Metriken
+"""
+
+import io
+import os
+
+import pytest
+from PIL import Image
+
+import image_batch
+import image_jobs
+import image_worker
+from image_store import OutputStore
+
+SETTINGS = {
+    "watermark_text": "© Test",
+    "opacity": 180,
+    "padding": 20,
+    "output_format": "JPEG",
+    "jpeg_quality": 85,
+    "is_pro": True,
+}
+
+
+class WorkerCrash(BaseException):
+    """Steht für einen Absturz des Worker-Prozesses mitten im Job"""
+
+
+def _crash(*args, **kwargs):
+    raise WorkerCrash()
+
+
+def _jpeg(red):
+    out = io.BytesIO()
+    Image.new("RGB", (64, 48), (red, 0, 0)).save(out, "JPEG")
+    return out.getvalue()
+
+
+def test_crashing_job_fails_after_max_attempts(tmp_path, monkeypatch):
+    monkeypatch.setattr(image_worker, "QUEUE_DIR", str(tmp_path / "queue"))
+    monkeypatch.setattr(image_jobs, "JOB_DIR", str(tmp_path / "jobs"))
+    monkeypatch.setattr(image_worker, "WORKER_MAX_ATTEMPTS", 2)
+    monkeypatch.setattr(image_worker, "run_job", _crash)
+
+    image_worker.submit_job("crash", "owner", [("a.jpg", _jpeg(200))], SETTINGS)
+
+    for attempt in range(2):
+        # Neustart nach dem Absturz: Job ist wieder eingereiht
+        assert image_worker.job_status("crash")["state"] == "queued"
+        (request,) = image_worker._queued_requests()
+        with pytest.raises(WorkerCrash):
+            image_worker.process_request(request)
+        assert image_worker.job_status("crash")["state"] == "running"
+        image_worker._requeue_interrupted()
+
+    status = image_worker.job_status("crash")
+    assert status["state"] == "failed"
+    assert "abgestürzt" in status["error"]
+    assert image_worker._queued_requests() == []
+
+
+def test_pool_render_counters_reach_worker_metrics(tmp_path, monkeypatch):
+    monkeypatch.setattr(image_worker, "QUEUE_DIR", str(tmp_path / "queue"))
+    monkeypatch.setattr(image_jobs, "JOB_DIR", str(tmp_path / "jobs"))
+    monkeypatch.setattr(image_batch, "output_store", OutputStore(str(tmp_path / "outputs"), 10**8, 3600))
+    monkeypatch.setattr(image_batch, "DEFAULT_WORKERS", 2)
+    monkeypatch.setattr(image_worker, "_render_caches", {})
+
+    image_worker.submit_job("pool", "owner", [(f"{idx}.jpg", _jpeg(idx * 40)) for idx in range(4)], SETTINGS)
+    (request,) = image_worker._queued_requests()
+    image_worker.process_request(request)
+    image_worker._record_metrics([])
+
+    # Gerechnet haben nur die Pool-Prozesse - die Zähler stammen von dort
+    assert image_worker._render_caches and os.getpid() not in image_worker._render_caches
+    render = image_worker.worker_cache_stats()["render"]
+    assert render["processes"] == len(image_worker._render_caches)
+    assert render["font"]["hits"] + render["font"]["misses"] >= 4
+    assert render["tile"]["misses"] >= 1
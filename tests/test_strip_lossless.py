@@ -0,0 +1,219 @@
+"""
+CreatorOS - Tests des verlustfreien Strippings
+strip_jpeg, strip_png und _jpeg_segments an synthetischen Dateien mit
+EXIF, GPS, XMP, Kommentaren und Text-Chunks
+"""
+
+import io
+
+import numpy as np
+import pytest
+from PIL import Image, PngImagePlugin
+
+from image_pipeline import (
+    EXIF_ORIENTATION,
+    JPEG_SOI,
+    _jpeg_segments,
+    strip_jpeg,
+    strip_metadata_lossless,
+    strip_png,
+)
+from image_spool import map_file
+
+# =============================================================================
+# TESTDATEN
+# =============================================================================
+
+GPS_IFD = 0x8825
+XMP_PACKET = b'<x:xmpmeta xmlns:x="adobe:ns:meta/"><rdf:RDF>geheim-xmp</rdf:RDF></x:xmpmeta>'
+COMMENT = b"geheimer-kommentar"
+TEXT = "geheimer-text"
+
+
+def _pixels():
+    """Bild mit Verlauf, damit verschobene oder neu kodierte Pixel auffallen"""
+    x = np.linspace(0, 255, 64, dtype=np.uint8)
+    rgb = np.stack(np.broadcast_arrays(x[None, :], x[:, None], x[::-1, None]), axis=-1)
+    return Image.fromarray(np.ascontiguousarray(rgb[:48]), "RGB")
+
+
+def _exif(orientation=6):
+    exif = Image.Exif()
+    exif[EXIF_ORIENTATION] = orientation
+    exif[0x010F] = "Kamera-Hersteller"
+    exif.get_ifd(GPS_IFD).update({1: "N", 2: (52.0, 31.0, 12.0), 3: "E", 4: (13.0, 24.0, 36.0)})
+    return exif
+
+
+def _jpeg(progressive=False, orientation=6):
+    out = io.BytesIO()
+    _pixels().save(
+        out, "JPEG",
+        quality=90,
+        progressive=progressive,
+        exif=_exif(orientation),
+        comment=COMMENT,
+        xmp=XMP_PACKET
+    )
+    return out.getvalue()
+
+
+def _png(orientation=6):
+    info = PngImagePlugin.PngInfo()
+    info.add_text("Comment", TEXT)
+    info.add_text("Author", TEXT, zip=True)
+    info.add_itxt("Description", TEXT)
+    info.add(b"tIME", b"\x07\xe9\x01\x02\x03\x04\x05")
+    out = io.BytesIO()
+    _pixels().save(out, "PNG", pnginfo=info, exif=_exif(orientation))
+    return out.getvalue()
+
+
+def _strip(fn, data):
+    out = io.BytesIO()
+    fn(data, out)
+    return out.getvalue()
+
+
+def _assert_no_metadata(stripped):
+    for secret in (b"Kamera-Hersteller", XMP_PACKET, b"geheim-xmp", COMMENT, TEXT.encode()):
+        assert secret not in stripped
+
+    exif = Image.open(io.BytesIO(stripped)).getexif()
+    assert set(exif) == {EXIF_ORIENTATION}
+    assert exif.get_ifd(GPS_IFD) == {}
+
+
+def _assert_same_pixels(original, stripped):
+    with Image.open(io.BytesIO(original)) as a, Image.open(io.BytesIO(stripped)) as b:
+        assert a.size == b.size
+        assert np.array_equal(np.asarray(a), np.asarray(b))
+
+# =============================================================================
+# JPEG
+# =============================================================================
+
+@pytest.mark.parametrize("progressive", [False, True])
+def test_strip_jpeg_removes_metadata_keeps_orientation_and_pixels(progressive):
+    original = _jpeg(progressive=progressive)
+    # Testdaten enthalten wirklich alles, was entfernt werden soll
+    assert COMMENT in original and b"geheim-xmp" in original and b"Kamera-Hersteller" in original
+
+    stripped = _strip(strip_jpeg, original)
+
+    _assert_no_metadata(stripped)
+    assert Image.open(io.BytesIO(stripped)).getexif()[EXIF_ORIENTATION] == 6
+    _assert_same_pixels(original, stripped)
+    assert len(stripped) < len(original)
+
+
+def test_strip_jpeg_without_rotation_writes_no_exif():
+    stripped = _strip(strip_jpeg, _jpeg(orientation=1))
+
+    assert b"Exif\x00\x00" not in stripped
+    assert dict(Image.open(io.BytesIO(stripped)).getexif()) == {}
+
+
+def test_strip_jpeg_drops_data_after_eoi():
+    original = _jpeg()
+    stripped = _strip(strip_jpeg, original + b"\xff\xd8angehaengtes-vorschaubild\xff\xd9")
+
+    assert stripped == _strip(strip_jpeg, original)
+
+
+def test_jpeg_segments_cover_file_up_to_eoi():
+    data = _jpeg(progressive=True)
+    segments = list(_jpeg_segments(data, 2))
+
+    assert segments[0][1] == 2
+    assert all(prev[2] == cur[1] for prev, cur in zip(segments, segments[1:]))
+    assert segments[-1][0] == 0xD9
+    assert segments[-1][2] == len(data)
+    # Progressiv: mehrere Scans
+    assert sum(marker == 0xDA for marker, _, _ in segments) > 1
+
+
+@pytest.mark.parametrize("cut", [1, 2, 3, 10, 200, 600])
+def test_strip_jpeg_truncated_raises_value_error(cut):
+    data = _jpeg(progressive=True)
+    with pytest.raises(ValueError):
+        _strip(strip_jpeg, data[:len(data) - cut])
+
+
+def test_strip_jpeg_header_only_raises_value_error():
+    data = _jpeg()
+    for size in (3, 4, 5, 20):
+        with pytest.raises(ValueError):
+            _strip(strip_jpeg, data[:size])
+
+# =============================================================================
+# PNG
+# =============================================================================
+
+def test_strip_png_removes_metadata_keeps_orientation_and_pixels():
+    original = _png()
+    assert TEXT.encode() in original and b"tIME" in original
+
+    stripped = _strip(strip_png, original)
+
+    _assert_no_metadata(stripped)
+    for chunk_type in (b"tEXt", b"zTXt", b"iTXt", b"tIME"):
+        assert chunk_type not in stripped
+    assert Image.open(io.BytesIO(stripped)).getexif()[EXIF_ORIENTATION] == 6
+    _assert_same_pixels(original, stripped)
+
+
+def test_strip_png_without_rotation_writes_no_exif():
+    stripped = _strip(strip_png, _png(orientation=1))
+
+    assert b"eXIf" not in stripped
+
+
+@pytest.mark.parametrize("cut", [1, 4, 12, 40])
+def test_strip_png_truncated_raises_value_error(cut):
+    data = _png()
+    with pytest.raises(ValueError):
+        _strip(strip_png, data[:len(data) - cut])
+
+# =============================================================================
+# MMAP
+# =============================================================================
+
+@pytest.mark.parametrize("make", [_jpeg, _png])
+def test_strip_reads_mmap_directly(tmp_path, make):
+    original = make()
+    path = tmp_path / "input"
+    path.write_bytes(original)
+
+    with map_file(path) as mapped:
+        stripped = strip_metadata_lossless(mapped)
+
+    assert stripped == strip_metadata_lossless(original)
+
+
+@pytest.mark.parametrize("make", [_jpeg, _png])
+def test_strip_truncated_mmap_still_closes(tmp_path, make):
+    data = make()
+    path = tmp_path / "input"
+    path.write_bytes(data[:len(data) - 12])
+
+    # Keine Teilansicht darf das mmap offen halten (sonst BufferError beim Schließen)
+    with pytest.raises(ValueError):
+        with map_file(path) as mapped:
+            strip_metadata_lossless(mapped)
+
+# =============================================================================
+# DISPATCH
+# =============================================================================
+
+def test_strip_metadata_lossless_detects_container():
+    assert strip_metadata_lossless(_jpeg())[1] == "jpg"
+    assert strip_metadata_lossless(_png())[1] == "png"
+    assert strip_metadata_lossless(_jpeg())[0][:2] == JPEG_SOI
+
+
+def test_strip_metadata_lossless_rejects_other_formats():
+    out = io.BytesIO()
+    _pixels().save(out, "GIF")
+    with pytest.raises(ValueError):
+        strip_metadata_lossless(out.getvalue())
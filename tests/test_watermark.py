@@ -0,0 +1,62 @@
+"""
+CreatorOS - Tests des gekachelten Wasserzeichens
+Alle Wege von add_watermark müssen pixelgleich zum Zeichnen pro Raster-
+Position sein - auch oben, wo Unterlängen keine Kachelzeile darüber haben
+"""
+
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+
+from image_pipeline import WATERMARK_COLOR, add_watermark, font_size_bucket, get_font
+
+OPACITY = 180
+
+# (Bildgröße, Text, Abstand): großer Text mit kleinem Abstand ragt in die
+# nächste Kachelzeile, "j" hat eine negative linke Seitenpeilung. Flache
+# Zeichen ("...", "_", "-") liegen weit unter ihrem Ursprung und ragen mit
+# kleinem Abstand mehrere Kachelzeilen weit
+CASES = [
+    ((1500, 4000), "© Studio gyp", 10),
+    ((640, 1200), "Created with CreatorOS", 20),
+    ((500, 500), "jÄg", 60),
+    ((900, 600), "...", 2),
+    ((700, 2000), "...", 10),
+    ((800, 1200), "_", 3),
+    ((600, 1600), "-", 1),
+]
+
+
+def _draw_per_position(image, text, padding):
+    """Referenz: Text an jede Raster-Position zeichnen (ursprüngliches Verfahren)"""
+    base = image.convert("RGBA")
+    overlay = Image.new("RGBA", base.size, (255, 255, 255, 0))
+    draw = ImageDraw.Draw(overlay)
+    font = get_font(font_size_bucket(int(image.height * 0.05)))
+    bbox = draw.textbbox((0, 0), text, font=font)
+    x_step = bbox[2] - bbox[0] + padding
+    y_step = bbox[3] - bbox[1] + padding
+
+    for y in range(0, base.height + y_step, y_step):
+        for x in range(0, base.width + x_step, x_step):
+            draw.text((x, y), text, fill=WATERMARK_COLOR + (OPACITY,), font=font)
+    return Image.alpha_composite(base, overlay).convert("RGB")
+
+
+def _noise(size):
+    rng = np.random.default_rng(0)
+    return Image.fromarray(rng.integers(0, 256, (size[1], size[0], 3), dtype=np.uint8))
+
+
+@pytest.mark.parametrize("size, text, padding", CASES)
+@pytest.mark.parametrize("variant", ["rgb", "rgba", "banded"])
+def test_tiled_watermark_matches_per_position_drawing(size, text, padding, variant):
+    image = _noise(size)
+    expected = np.asarray(_draw_per_position(image, text, padding))
+
+    if variant == "rgb":
+        result = add_watermark(image, text, OPACITY, padding, True)
+    else:
+        result = add_watermark(image.convert("RGBA"), text, OPACITY, padding, True, banded=variant == "banded")
+
+    assert np.array_equal(np.asarray(result), expected)
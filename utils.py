@@ -39,7 +39,7 @@ DATENSCHUTZ_TEXT = """
 Wir erheben nur die für die Nutzung der App notwendigen Daten (E-Mail, Passwort verschlüsselt).
 
 **2. Nutzung**  
-Ihre hochgeladenen Bilder werden nicht gespeichert und verbleiben nur temporär im RAM während der Verarbeitung.
+Ihre hochgeladenen Bilder werden nicht dauerhaft gespeichert. Für die Verarbeitung liegen die Originale bis maximal 60 Minuten nach der letzten Nutzung temporär auf dem Server, fertig verarbeitete Bilder für den Download maximal 60 Minuten. Beides wird danach automatisch gelöscht.
 
 **3. Supabase**  
 Wir nutzen Supabase für Authentifizierung und Einstellungen. Details: https://supabase.com/privacy
@@ -229,6 +229,12 @@ def init_session_state():
     
     if "jpeg_quality" not in st.session_state:
         st.session_state["jpeg_quality"] = 85
+    
+    if "encoder_profile" not in st.session_state:
+        st.session_state["encoder_profile"] = "balanced"
+    
+    if "export_presets" not in st.session_state:
+        st.session_state["export_presets"] = ["original"]
 
 # =============================================================================
 # AUTH FUNCTIONS